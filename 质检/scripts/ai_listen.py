@@ -4,25 +4,47 @@ Layer 2: AI 听感评估 — 用 Gemini Audio API 评估剪辑质量
 
 两种采样策略：
 1. 全局采样 — 等间隔抽取 6 个 30s 片段，评估整体节奏和风格一致性
+   （--sampling cuts：按拼接点密度选窗口，同样的调用次数听到尽可能多的拼接点）
 2. 可疑片段复查 — 对 Layer 1 标记的 HIGH 问题片段做 AI 二次确认，减少误报
 
 需要 GEMINI_API_KEY 环境变量。
 
+整集只用 ffmpeg 解码一次（16kHz 单声道，管道输出），片段直接从内存切片并封装成 WAV；
+所有片段提取好后，由线程池并发请求（--concurrency），按 --rpm 均匀限流；
+每个请求独立重试，报告顺序与片段顺序一致，不受完成先后影响。
+
+解析后的响应按 (片段 PCM, prompt, 模型) 的哈希缓存在输出目录的 qa_ai_cache.json，
+重剪后未变化的片段直接复用；--no-cache 强制重新评估。
+
+--audio-format flac/opus 在内存中压缩片段再上传（上行慢时明显减少请求耗时），
+报告 upload 字段给出实际发送字节数。
+
 用法：
     python3 ai_listen.py --input podcast.mp3 --signal-report qa_signal_report.json --output qa_ai_report.json
     python3 ai_listen.py --input podcast.mp3 --output qa_ai_report.json   # 无 Layer 1 报告，仅全局采样
+    python3 ai_listen.py --input podcast.mp3 --output qa_ai_report.json --rpm 10   # 免费额度限流
+    python3 ai_listen.py --input podcast.mp3 --output qa_ai_report.json --no-cache   # 忽略缓存，全部重新评估
+    python3 ai_listen.py --input podcast.mp3 --output qa_ai_report.json --sampling cuts --edl delete_segments_edited.json
+    python3 ai_listen.py --input podcast.mp3 --output qa_ai_report.json --audio-format opus --bitrate 32k
+    python3 ai_listen.py ... --base-url http://127.0.0.1:8765   # 指向本地 gemini_stub.py（测试/压测）
 """
 
 import argparse
+import bisect
+import hashlib
 import json
 import os
 import re
+import struct
 import subprocess
 import sys
-import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import numpy as np
+
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
 
@@ -52,6 +74,35 @@ Respond in this exact JSON format (no markdown):
 If there are no issues, use an empty array: "issues": []
 Be strict but fair. Natural speech pauses and filler words are normal in podcasts."""
 
+EVAL_PROMPT_SUSPICIOUS_BATCH = """You are a professional podcast editor. A signal analysis tool flagged potential edit quality issues at {n} locations in a Chinese podcast.
+
+You will hear {n} separate audio clips. Each clip is about 10 seconds long, centered on one flagged point, and is preceded by a text label "Clip N". Judge every clip independently.
+
+The flagged issues:
+{issue_list}
+
+For EACH clip:
+1. Is this a REAL audio quality issue that a listener would notice? Or is it normal speech variation (natural pause, speaker change, emphasis)?
+2. If it IS a real issue, rate severity 1-10 (10 = worst).
+3. VERDICT: "confirmed" (real issue) / "false_positive" (normal, not an issue)
+
+Respond with a JSON array containing exactly one object per clip, in clip order (no markdown):
+[
+  {{"clip": 1, "is_real_issue": false, "severity": 0, "explanation": "This is a natural speaker change, not an edit artifact", "verdict": "false_positive"}}
+]"""
+
+CLIP_SR = 16000  # Gemini 音频输入会降到 16kHz，片段直接按这个采样率提取
+CACHE_VERSION = 2
+
+SPLICE_CONTEXT_S = 2.0  # 拼接点前后至少各有 2s 在片段内，才算"听到"了这个拼接点
+
+# 上传编码：format → (MIME, ffmpeg 输出参数)；opus 的 {bitrate} 由 --bitrate 填入
+AUDIO_FORMATS = {
+    "wav": ("audio/wav", None),
+    "flac": ("audio/flac", ['-c:a', 'flac', '-f', 'flac']),
+    "opus": ("audio/ogg", ['-c:a', 'libopus', '-b:a', '{bitrate}', '-application', 'voip', '-f', 'ogg']),
+}
+
 EVAL_PROMPT_SUSPICIOUS = """You are a professional podcast editor. A signal analysis tool flagged a potential edit quality issue at this location in a Chinese podcast.
 
 The flagged issue: {issue_detail}
@@ -73,82 +124,285 @@ Respond in this exact JSON format (no markdown):
 }}"""
 
 
-def extract_clip(input_path, start, duration, output_path):
-    """用 ffmpeg atrim 提取音频片段为 WAV"""
+def decode_audio(input_path, sr=CLIP_SR):
+    """ffmpeg 一次性把整集解码为 sr 单声道 int16 PCM（管道输出，不写临时文件）"""
     cmd = [
-        'ffmpeg', '-v', 'quiet',
+        'ffmpeg', '-v', 'error',
         '-i', input_path,
-        '-af', f'atrim=start={start:.3f}:end={start + duration:.3f},asetpts=PTS-STARTPTS',
-        '-c:a', 'pcm_s16le', '-ar', '16000', '-ac', '1',
-        '-y', output_path
+        '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(sr), '-ac', '1',
+        '-'
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        return False
-    return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
 
+def clip_pcm(pcm, start, end, sr=CLIP_SR):
+    """从整集 PCM 切出 [start, end) 秒（NumPy 视图，不复制）"""
+    return pcm[int(round(start * sr)):int(round(end * sr))]
 
-def call_gemini(client, model, audio_bytes, prompt, max_retries=3):
-    """调用 Gemini API 评估音频片段，带重试"""
+
+def clip_wav_bytes(pcm, start, end, sr=CLIP_SR):
+    """从整集 PCM 切出 [start, end) 秒，在内存中封装为 WAV"""
+    clip = clip_pcm(pcm, start, end, sr)
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + clip.nbytes, b'WAVE',
+        b'fmt ', 16, 1, 1, sr, sr * 2, 2, 16,
+        b'data', clip.nbytes,
+    )
+    return header + clip.tobytes()
+
+
+def encode_clip(wav_bytes, audio_format="wav", bitrate="32k"):
+    """
+    在内存中把 WAV 片段编码为上传格式（ffmpeg stdin → stdout，不写临时文件）。
+
+    返回 (payload, mime_type, 实际使用的格式)；编码失败时退回原始 WAV。
+    """
+    mime_type, codec_args = AUDIO_FORMATS[audio_format]
+    if codec_args is None:
+        return wav_bytes, mime_type, audio_format
+
+    cmd = ['ffmpeg', '-v', 'error', '-f', 'wav', '-i', 'pipe:0']
+    cmd += [arg.format(bitrate=bitrate) for arg in codec_args]
+    cmd += ['pipe:1']
+    result = subprocess.run(cmd, input=wav_bytes, capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        print(f"  ⚠️ {audio_format} 编码失败，改用 WAV: {result.stderr.decode(errors='replace')[:100]}")
+        return wav_bytes, "audio/wav", "wav"
+    return result.stdout, mime_type, audio_format
+
+
+def encoding_label(audio_format, bitrate):
+    """缓存 key / 报告里用的编码描述（有损格式带码率）"""
+    return f"{audio_format}@{bitrate}" if audio_format == "opus" else audio_format
+
+
+class RateLimiter:
+    """
+    限流：相邻两个请求的发出时刻至少间隔 60 / rpm 秒，任意 60 秒内不超过 rpm 个请求。
+
+    不允许突发，并发度只限制同时在途的请求数，不影响发出速率。发出时刻在醒来后
+    重新检查并记录，睡眠误差不会把两个请求挤到一起。rpm 为 0 / None 时不限流。
+    """
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.interval <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._next:
+                    self._next = now + self.interval
+                    return
+                wait = self._next - now
+            time.sleep(wait)
+
+
+def call_gemini(client, model, audio_bytes, prompt, max_retries=3, limiter=None, label="", mime_type="audio/wav"):
+    """
+    调用 Gemini API 评估音频片段，带重试（每次尝试前都向限流器取令牌）。
+
+    audio_bytes 也可以是 [(标签文字, bytes, mime_type), ...]，多个片段放进同一个请求。
+    """
     from google.genai import types
 
+    contents = [prompt]
+    if isinstance(audio_bytes, list):
+        for caption, data, part_mime in audio_bytes:
+            contents += [caption, types.Part.from_bytes(data=data, mime_type=part_mime)]
+    else:
+        contents.append(types.Part.from_bytes(data=audio_bytes, mime_type=mime_type))
+
     for attempt in range(max_retries):
+        if limiter:
+            limiter.acquire()
         try:
-            response = client.models.generate_content(
-                model=model,
-                contents=[
-                    prompt,
-                    types.Part.from_bytes(data=audio_bytes, mime_type="audio/wav")
-                ]
-            )
+            response = client.models.generate_content(model=model, contents=contents)
             return response.text
         except Exception as e:
             error_str = str(e)
             if 'RATE_LIMIT' in error_str or '429' in error_str:
                 wait = (2 ** attempt) * 2  # 2, 4, 8 seconds
-                print(f"  ⏳ Rate limited, waiting {wait}s...")
+                print(f"  ⏳ {label} Rate limited, waiting {wait}s...")
                 time.sleep(wait)
                 continue
             elif attempt < max_retries - 1:
-                print(f"  ⚠️ API error (attempt {attempt + 1}): {error_str[:100]}")
+                print(f"  ⚠️ {label} API error (attempt {attempt + 1}): {error_str[:100]}")
                 time.sleep(1)
                 continue
             else:
-                print(f"  ❌ API failed after {max_retries} attempts: {error_str[:100]}")
+                print(f"  ❌ {label} API failed after {max_retries} attempts: {error_str[:100]}")
                 return None
     return None
 
 
-def parse_json_response(text):
-    """从 Gemini 返回的文本中提取 JSON"""
+def run_requests(client, model, jobs, concurrency=8, limiter=None):
+    """
+    并发执行一批 Gemini 请求，返回与 jobs 同序的响应文本列表。
+
+    jobs: [{"label": str, "payload": bytes, "mime_type": str, "prompt": str}, ...]
+    进度按完成先后打印，结果按提交顺序返回，报告内容与并发度无关。
+    """
+    results = [None] * len(jobs)
+    if not jobs:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {
+            pool.submit(call_gemini, client, model, job['payload'], job['prompt'],
+                        limiter=limiter, label=job['label'], mime_type=job['mime_type']): i
+            for i, job in enumerate(jobs)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = future.result()
+            status = "✓" if results[i] is not None else "✗"
+            print(f"   {status} [{done}/{len(jobs)}] {jobs[i]['label']}")
+    return results
+
+
+def parse_json_response(text, expect=dict):
+    """
+    从 Gemini 返回的文本中提取 JSON。
+
+    expect 是期望的顶层类型：批量复查为 list，其余为 dict；类型不符视为解析失败，返回 None。
+    """
     if not text:
         return None
 
-    # 尝试直接解析
+    def parsed_as(candidate):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, expect) else None
+
+    # 尝试直接解析（整段就是合法 JSON 时，形状不对直接判失败）
     try:
-        return json.loads(text)
+        value = json.loads(text)
+        return value if isinstance(value, expect) else None
     except json.JSONDecodeError:
         pass
 
     # 尝试从 markdown 代码块中提取
     match = re.search(r'```(?:json)?\s*\n(.*?)\n```', text, re.DOTALL)
     if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError:
-            pass
+        return parsed_as(match.group(1))
 
-    # 尝试找到 JSON 对象
-    match = re.search(r'\{.*\}', text, re.DOTALL)
+    # 尝试找到 JSON 数组（批量复查）或对象
+    pattern = r'\[\s*\{.*\}\s*\]' if expect is list else r'\{.*\}'
+    match = re.search(pattern, text, re.DOTALL)
     if match:
-        try:
-            return json.loads(match.group(0))
-        except json.JSONDecodeError:
-            pass
+        return parsed_as(match.group(0))
 
     return None
 
 
+def expected_shape(job):
+    """批量复查的响应是 JSON 数组，其余请求是 JSON 对象"""
+    return list if job['strategy'] == 'suspicious_batch' else dict
+
+
+def map_batch_verdicts(parsed, n_clips):
+    """把批量复查返回的 JSON 数组按 clip 编号映射回各片段（编号缺失时按位置），缺的为 None"""
+    verdicts = [None] * n_clips
+    if not isinstance(parsed, list):
+        return verdicts
+    for pos, item in enumerate(parsed):
+        if not isinstance(item, dict):
+            continue
+        clip = item.get('clip')
+        idx = clip - 1 if isinstance(clip, int) and 1 <= clip <= n_clips else pos
+        if idx < n_clips and verdicts[idx] is None:
+            verdicts[idx] = item
+    return verdicts
+
+
+def build_suspicious_entry(issue, start, end, parsed):
+    """可疑片段复查结果 → 报告条目"""
+    return {
+        "strategy": "suspicious_review",
+        "clip_range": [round(start, 1), round(end, 1)],
+        "original_issue": {
+            "timestamp": issue['timestamp'],
+            "type": issue['type'],
+            "detail": issue['detail'],
+            "metric": issue.get('metric')
+        },
+        "is_real_issue": parsed.get('is_real_issue', False),
+        "severity": parsed.get('severity', 0),
+        "explanation": parsed.get('explanation', ''),
+        "verdict": parsed.get('verdict', 'unknown'),
+    }
+
+
+class ResponseCache:
+    """
+    Gemini 响应缓存（JSON 文件），key = sha256(片段 PCM 采样 + prompt + 模型名 + 上传编码参数)。
+
+    key 只看 PCM 和编码参数（格式、码率），不看编码后的字节，换 ffmpeg 版本不会让缓存失效。
+
+    只缓存成功解析的响应；超过 ttl_days 的条目丢弃，条目数超过 max_entries 时
+    淘汰最久未使用的。
+    """
+
+    def __init__(self, path, ttl_days=30, max_entries=500):
+        self.path = Path(path)
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_VERSION:
+                    self.entries = data.get('responses', {})
+            except (json.JSONDecodeError, OSError):
+                print(f"⚠️ 缓存文件损坏，忽略: {self.path}")
+
+    @staticmethod
+    def key(clips, prompt, model, encoding="wav"):
+        """clips: 片段的 int16 PCM 数组列表（批量复查为多个）"""
+        h = hashlib.sha256()
+        params = f"{encoding}/{CLIP_SR}Hz/s16".encode()
+        for part in (model.encode(), prompt.encode(), params, *(np.ascontiguousarray(c).tobytes() for c in clips)):
+            h.update(len(part).to_bytes(8, 'little'))
+            h.update(part)
+        return h.hexdigest()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry['created'] > self.ttl:
+            return None
+        entry['last_used'] = time.time()
+        return entry['parsed']
+
+    def put(self, key, parsed):
+        now = time.time()
+        self.entries[key] = {"created": now, "last_used": now, "parsed": parsed}
+
+    def save(self):
+        now = time.time()
+        live = {k: e for k, e in self.entries.items() if now - e['created'] <= self.ttl}
+        if len(live) > self.max_entries:
+            keep = sorted(live, key=lambda k: live[k]['last_used'], reverse=True)[:self.max_entries]
+            live = {k: live[k] for k in keep}
+        self.entries = live
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "responses": live}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
 def get_global_sample_times(duration, n_samples=6, clip_duration=30):
     """计算全局等间隔采样点"""
     if duration < clip_duration * 2:
@@ -169,6 +423,64 @@ def get_global_sample_times(duration, n_samples=6, clip_duration=30):
     return times
 
 
+def load_splice_times(edl_path=None, signal_report=None):
+    """
+    成品时间轴上的拼接点：优先用 EDL（delete_segments，计划拼接点），
+    其次用 Layer 1 报告的切点（cut_times；旧报告只有 issues 时退回 issue 时间戳）。
+    """
+    if edl_path:
+        from signal_analysis import load_planned_splices
+        return sorted(s[0] for s in load_planned_splices(edl_path))
+    if signal_report:
+        if 'cut_times' in signal_report:
+            return sorted(signal_report['cut_times'])
+        return sorted({i['timestamp'] for i in signal_report.get('issues', [])})
+    return []
+
+
+def _window_hears(start, end, t, duration):
+    """片段 [start, end) 是否完整听到 t 处的拼接点（贴着音频首尾时不要求上下文）"""
+    lo = start + SPLICE_CONTEXT_S if start > 0 else 0
+    hi = end - SPLICE_CONTEXT_S if end < duration else duration
+    return lo <= t <= hi
+
+
+def get_cut_density_sample_times(duration, splice_times, n_samples=6, clip_duration=30):
+    """
+    按拼接点密度选全局采样窗口（贪心最大覆盖）。
+
+    候选窗口都让某个拼接点恰好落在窗口开头的上下文边界上（一维定长区间覆盖的最优解
+    必在这些位置之中）；每轮选听到最多"还没听过"拼接点的窗口，直到用完调用预算
+    或全部拼接点都已覆盖。返回按时间排序的窗口起点。
+    """
+    splices = sorted(t for t in splice_times if 0 <= t <= duration)
+    if not splices or duration <= clip_duration:
+        return get_global_sample_times(duration, n_samples, clip_duration)
+
+    candidates = sorted({round(max(0.0, min(t - SPLICE_CONTEXT_S, duration - clip_duration)), 3) for t in splices})
+    remaining = set(range(len(splices)))
+    chosen = []
+    while remaining and len(chosen) < n_samples:
+        best_start, best_heard = None, set()
+        for start in candidates:
+            end = min(start + clip_duration, duration)
+            lo, hi = bisect.bisect_left(splices, start), bisect.bisect_right(splices, end)
+            heard = {i for i in range(lo, hi) if i in remaining and _window_hears(start, end, splices[i], duration)}
+            if len(heard) > len(best_heard):
+                best_start, best_heard = start, heard
+        if not best_heard:
+            break
+        chosen.append(round(best_start, 1))
+        remaining -= best_heard
+    return sorted(chosen)
+
+
+def splice_coverage(sample_times, splice_times, duration, clip_duration=30):
+    """被全局采样片段听到的拼接点数"""
+    windows = [(s, min(s + clip_duration, duration)) for s in sample_times]
+    return sum(1 for t in splice_times if any(_window_hears(s, e, t, duration) for s, e in windows))
+
+
 def get_suspicious_clips(signal_report, max_clips=10):
     """从 Layer 1 报告中提取最严重的 HIGH issues"""
     issues = signal_report.get('issues', [])
@@ -205,7 +517,22 @@ def main():
     parser.add_argument("--output", "-o", required=True, help="Output AI report JSON path")
     parser.add_argument("--model", "-m", default="gemini-2.5-flash", help="Gemini model (default: gemini-2.5-flash)")
     parser.add_argument("--global-samples", type=int, default=6, help="Number of global sample clips (default: 6)")
+    parser.add_argument("--sampling", choices=["even", "cuts"], default="even",
+                        help="Global sampling: evenly spaced, or windows maximising splice coverage (default: even)")
+    parser.add_argument("--edl", help="delete_segments JSON, used as the splice list for --sampling cuts")
     parser.add_argument("--max-suspicious", type=int, default=10, help="Max suspicious clips to review (default: 10)")
+    parser.add_argument("--suspicious-batch", type=int, default=1,
+                        help="Suspicious clips per request; >1 asks for a JSON array of verdicts (default: 1)")
+    parser.add_argument("--concurrency", "-j", type=int, default=8, help="Max in-flight API requests (default: 8)")
+    parser.add_argument("--rpm", type=float, default=0, help="Requests-per-minute limit, 0 = unlimited (free tier: 10)")
+    parser.add_argument("--base-url", help="Override Gemini API endpoint (e.g. local gemini_stub.py)")
+    parser.add_argument("--audio-format", choices=sorted(AUDIO_FORMATS), default="wav",
+                        help="Upload encoding for clips (default: wav)")
+    parser.add_argument("--bitrate", default="32k", help="Opus bitrate (default: 32k)")
+    parser.add_argument("--cache", help="Response cache path (default: qa_ai_cache.json next to --output)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached responses and re-evaluate every clip")
+    parser.add_argument("--cache-ttl-days", type=float, default=30, help="Drop cached responses older than this (default: 30)")
+    parser.add_argument("--cache-max-entries", type=int, default=500, help="Keep at most this many cached responses (default: 500)")
     args = parser.parse_args()
 
     # 检查输入文件
@@ -226,6 +553,9 @@ def main():
                         api_key = line.split('=', 1)[1].strip().strip('"').strip("'")
                         break
 
+    if not api_key and args.base_url:
+        api_key = "local-stub"  # 本地 stub 不校验 key
+
     if not api_key:
         print("❌ 未找到 GEMINI_API_KEY")
         print("   设置方法:")
@@ -236,16 +566,19 @@ def main():
     # 初始化 Gemini client
     print("🤖 初始化 Gemini API...")
     from google import genai
-    client = genai.Client(api_key=api_key)
-
-    # 获取音频时长
-    result = subprocess.run(
-        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-         '-of', 'default=noprint_wrappers=1:nokey=1', args.input],
-        capture_output=True, text=True
-    )
-    duration = float(result.stdout.strip())
-    print(f"📊 音频: {Path(args.input).name}")
+    from google.genai import types
+    http_options = types.HttpOptions(base_url=args.base_url) if args.base_url else None
+    client = genai.Client(api_key=api_key, http_options=http_options)
+    limiter = RateLimiter(args.rpm)
+
+    # 一次性解码整集（时长也由解码结果得出）
+    t0 = time.monotonic()
+    pcm = decode_audio(args.input)
+    if pcm is None:
+        print(f"❌ 音频解码失败: {args.input}")
+        sys.exit(1)
+    duration = len(pcm) / CLIP_SR
+    print(f"📊 音频: {Path(args.input).name}（解码 {time.monotonic() - t0:.1f}s）")
     print(f"   时长: {format_time(duration)} ({duration:.1f}s)")
     print(f"   模型: {args.model}")
     print()
@@ -260,29 +593,149 @@ def main():
 
     evaluations = []
 
-    # ===== 策略 1: 全局采样 =====
-    print(f"\n🎧 策略 1: 全局采样 ({args.global_samples} 个 30s 片段)")
-    sample_times = get_global_sample_times(duration, args.global_samples, 30)
+    # ===== 提取片段 =====
+    splice_times = load_splice_times(args.edl, signal_report)
+    sampling_mode = args.sampling
+    if sampling_mode == "cuts" and not splice_times:
+        print("⚠️ --sampling cuts 需要 --edl 或 Layer 1 报告提供拼接点，改用等间隔采样")
+        sampling_mode = "even"
+
+    print(f"\n🎧 策略 1: 全局采样 (≤{args.global_samples} 个 30s 片段, {sampling_mode})")
+    if sampling_mode == "cuts":
+        sample_times = get_cut_density_sample_times(duration, splice_times, args.global_samples, 30)
+    else:
+        sample_times = get_global_sample_times(duration, args.global_samples, 30)
     print(f"   采样点: {', '.join(format_time(t) for t in sample_times)}")
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        for idx, start in enumerate(sample_times):
-            clip_path = os.path.join(tmpdir, f"global_{idx}.wav")
-            end = min(start + 30, duration)
-            clip_dur = end - start
-
-            print(f"   [{idx + 1}/{len(sample_times)}] {format_time(start)}-{format_time(end)} ...", end=" ", flush=True)
-
-            if not extract_clip(args.input, start, clip_dur, clip_path):
-                print("⚠️ 提取失败，跳过")
-                continue
-
-            with open(clip_path, 'rb') as f:
-                audio_bytes = f.read()
-
-            response_text = call_gemini(client, args.model, audio_bytes, EVAL_PROMPT_GLOBAL)
-            parsed = parse_json_response(response_text)
+    sampling = {"mode": sampling_mode, "clips": len(sample_times)}
+    if splice_times:
+        heard = splice_coverage(sample_times, splice_times, duration, 30)
+        sampling.update({
+            "splices_total": len(splice_times),
+            "splices_heard": heard,
+            "coverage": round(heard / len(splice_times), 3),
+        })
+        print(f"   拼接点覆盖: {heard}/{len(splice_times)} ({heard / len(splice_times) * 100:.0f}%)")
+
+    suspicious = []
+    if signal_report:
+        suspicious = get_suspicious_clips(signal_report, args.max_suspicious)
+        if suspicious:
+            print(f"\n🔍 策略 2: 可疑片段复查 ({len(suspicious)} 个 10s 片段)")
+        else:
+            print("\n🔍 策略 2: 无 HIGH 级别问题需要复查")
+    else:
+        print("\n🔍 策略 2: 未提供 Layer 1 报告，跳过可疑片段复查")
+
+    jobs = []
+    t0 = time.monotonic()
+    for idx, start in enumerate(sample_times):
+        end = min(start + 30, duration)
+        jobs.append({
+            "strategy": "global_sampling",
+            "label": f"global {idx + 1}/{len(sample_times)} {format_time(start)}-{format_time(end)}",
+            "start": start, "end": end,
+            "audio_bytes": clip_wav_bytes(pcm, start, end),
+            "pcm": [clip_pcm(pcm, start, end)],
+            "prompt": EVAL_PROMPT_GLOBAL,
+        })
+
+    suspicious_clips = []
+    for issue in suspicious:
+        t = issue['timestamp']
+        start = max(0, t - 5)
+        end = min(duration, t + 5)
+        suspicious_clips.append({"issue": issue, "start": start, "end": end,
+                                 "audio_bytes": clip_wav_bytes(pcm, start, end),
+                                 "pcm": clip_pcm(pcm, start, end)})
+
+    batch_size = max(1, args.suspicious_batch)
+    if batch_size == 1:
+        for idx, clip in enumerate(suspicious_clips):
+            issue = clip['issue']
+            jobs.append({
+                "strategy": "suspicious_review",
+                "label": f"suspicious {idx + 1}/{len(suspicious)} {format_time(issue['timestamp'])} ({issue['detail'][:40]})",
+                "start": clip['start'], "end": clip['end'], "issue": issue,
+                "audio_bytes": clip['audio_bytes'],
+                "pcm": [clip['pcm']],
+                "prompt": EVAL_PROMPT_SUSPICIOUS.format(issue_detail=issue['detail']),
+            })
+    else:
+        # 批量：每 batch_size 个可疑片段合成一个请求（多个音频 part，各带 "Clip N" 标签）
+        for first in range(0, len(suspicious_clips), batch_size):
+            clips = suspicious_clips[first:first + batch_size]
+            issue_list = "\n".join(f"Clip {n}: {c['issue']['detail']}" for n, c in enumerate(clips, 1))
+            jobs.append({
+                "strategy": "suspicious_batch",
+                "label": f"suspicious {first + 1}-{first + len(clips)}/{len(suspicious)} (batch)",
+                "start": clips[0]['start'], "end": clips[-1]['end'], "clips": clips,
+                "pcm": [c['pcm'] for c in clips],
+                "prompt": EVAL_PROMPT_SUSPICIOUS_BATCH.format(n=len(clips), issue_list=issue_list),
+            })
+    print(f"\n✂️ 提取 {len(sample_times) + len(suspicious_clips)} 个片段（{len(jobs)} 个请求），用时 {(time.monotonic() - t0) * 1000:.0f}ms")
+
+    # ===== 查缓存 =====
+    encoding = encoding_label(args.audio_format, args.bitrate)
+    cache = ResponseCache(args.cache or Path(args.output).parent / "qa_ai_cache.json",
+                          args.cache_ttl_days, args.cache_max_entries)
+    for job in jobs:
+        job['cache_key'] = ResponseCache.key(job['pcm'], job['prompt'], args.model, encoding)
+        job['parsed'] = None if args.no_cache else cache.get(job['cache_key'])
+        if not isinstance(job['parsed'], expected_shape(job)):
+            job['parsed'] = None  # 旧版本缓存的形状不对：当作未命中重新请求
+    pending = [job for job in jobs if job['parsed'] is None]
+    cache_note = "（--no-cache）" if args.no_cache else ""
+    print(f"\n💾 缓存: {len(jobs) - len(pending)} 个请求命中，{len(pending)} 个需要发送{cache_note}")
+
+    # ===== 编码 + 并发请求 =====
+    for job in pending:
+        if job['strategy'] == 'suspicious_batch':
+            encoded = [encode_clip(c['audio_bytes'], args.audio_format, args.bitrate) for c in job['clips']]
+            job['payload'] = [(f"Clip {n}", data, mime) for n, (data, mime, _) in enumerate(encoded, 1)]
+            job['mime_type'] = None
+            used = {fmt for _, _, fmt in encoded}
+        else:
+            job['payload'], job['mime_type'], used_format = encode_clip(job['audio_bytes'], args.audio_format,
+                                                                        args.bitrate)
+            used = {used_format}
+        if used != {args.audio_format}:
+            # 编码失败退回了 WAV：响应按实际上传的编码缓存，不冒充请求的编码
+            used_encoding = ",".join(sorted(encoding_label(fmt, args.bitrate) for fmt in used))
+            job['cache_key'] = ResponseCache.key(job['pcm'], job['prompt'], args.model, used_encoding)
+    pcm_bytes = sum(sum(len(c['audio_bytes']) for c in job['clips']) if job['strategy'] == 'suspicious_batch'
+                    else len(job['audio_bytes']) for job in pending)
+    bytes_sent = sum(sum(len(part[1]) for part in job['payload']) if isinstance(job['payload'], list)
+                     else len(job['payload']) for job in pending)
+    if pending and args.audio_format != "wav":
+        print(f"\n📦 编码 {encoding}: {pcm_bytes / 1e6:.1f}MB → {bytes_sent / 1e6:.2f}MB "
+              f"({bytes_sent / max(pcm_bytes, 1) * 100:.0f}%)")
+
+    if pending:
+        rpm_note = f", ≤{args.rpm:g} RPM" if args.rpm else ""
+        print(f"\n🚀 发送 {len(pending)} 个请求 (并发 {args.concurrency}{rpm_note})")
+        t0 = time.monotonic()
+        responses = run_requests(client, args.model, pending, args.concurrency, limiter)
+        print(f"   完成，用时 {time.monotonic() - t0:.1f}s")
+        for job, response_text in zip(pending, responses):
+            job['response_text'] = response_text
+            job['parsed'] = parse_json_response(response_text, expected_shape(job))
+            complete = job['parsed'] and (job['strategy'] != 'suspicious_batch'
+                                          or None not in map_batch_verdicts(job['parsed'], len(job['clips'])))
+            if complete:
+                cache.put(job['cache_key'], job['parsed'])
+    if jobs:
+        cache.save()  # 全部命中时也要写回，刷新 last_used，LRU / TTL 才不会淘汰正在用的条目
+
+    # ===== 按片段顺序整理结果 =====
+    print()
+    for job in jobs:
+        parsed = job['parsed']
+        response_text = job.get('response_text')
+        start, end = job['start'], job['end']
+        print(f"   {job['label']} ...", end=" ")
 
+        if job['strategy'] == 'global_sampling':
             if parsed:
                 # 将片段内的时间偏移转换为全局时间
                 issues = []
@@ -313,61 +766,26 @@ def main():
                     "verdict": "parse_error",
                     "raw_response": (response_text or "")[:500]
                 })
-
-        # ===== 策略 2: 可疑片段复查 =====
-        if signal_report:
-            suspicious = get_suspicious_clips(signal_report, args.max_suspicious)
-            if suspicious:
-                print(f"\n🔍 策略 2: 可疑片段复查 ({len(suspicious)} 个 10s 片段)")
-
-                for idx, issue in enumerate(suspicious):
-                    t = issue['timestamp']
-                    start = max(0, t - 5)
-                    end = min(duration, t + 5)
-                    clip_dur = end - start
-                    clip_path = os.path.join(tmpdir, f"suspicious_{idx}.wav")
-
-                    print(f"   [{idx + 1}/{len(suspicious)}] {format_time(t)} ({issue['detail'][:40]}) ...", end=" ", flush=True)
-
-                    if not extract_clip(args.input, start, clip_dur, clip_path):
-                        print("⚠️ 提取失败，跳过")
-                        continue
-
-                    with open(clip_path, 'rb') as f:
-                        audio_bytes = f.read()
-
-                    prompt = EVAL_PROMPT_SUSPICIOUS.format(issue_detail=issue['detail'])
-                    response_text = call_gemini(client, args.model, audio_bytes, prompt)
-                    parsed = parse_json_response(response_text)
-
-                    if parsed:
-                        verdict = parsed.get('verdict', 'unknown')
-                        is_real = parsed.get('is_real_issue', False)
-
-                        eval_entry = {
-                            "strategy": "suspicious_review",
-                            "clip_range": [round(start, 1), round(end, 1)],
-                            "original_issue": {
-                                "timestamp": t,
-                                "type": issue['type'],
-                                "detail": issue['detail'],
-                                "metric": issue.get('metric')
-                            },
-                            "is_real_issue": is_real,
-                            "severity": parsed.get('severity', 0),
-                            "explanation": parsed.get('explanation', ''),
-                            "verdict": verdict,
-                        }
-                        evaluations.append(eval_entry)
-
-                        emoji = "⚠️" if is_real else "✅"
-                        print(f"{emoji} {'真问题' if is_real else '误报'}: {parsed.get('explanation', '')[:50]}")
-                    else:
-                        print("⚠️ 解析失败")
-            else:
-                print("\n🔍 策略 2: 无 HIGH 级别问题需要复查")
         else:
-            print("\n🔍 策略 2: 未提供 Layer 1 报告，跳过可疑片段复查")
+            if job['strategy'] == 'suspicious_batch':
+                reviews = list(zip(job['clips'], map_batch_verdicts(parsed, len(job['clips']))))
+                print(f"{sum(1 for _, v in reviews if v)}/{len(reviews)} 个判定")
+            else:
+                reviews = [({"issue": job['issue'], "start": start, "end": end}, parsed)]
+
+            for clip, verdict in reviews:
+                if job['strategy'] == 'suspicious_batch':
+                    issue = clip['issue']
+                    print(f"      {format_time(issue['timestamp'])} ({issue['detail'][:40]}) ...", end=" ")
+                if verdict:
+                    eval_entry = build_suspicious_entry(clip['issue'], clip['start'], clip['end'], verdict)
+                    evaluations.append(eval_entry)
+
+                    is_real = eval_entry['is_real_issue']
+                    emoji = "⚠️" if is_real else "✅"
+                    print(f"{emoji} {'真问题' if is_real else '误报'}: {eval_entry['explanation'][:50]}")
+                else:
+                    print("⚠️ 解析失败")
 
     # ===== 计算综合 AI 评分 =====
     global_scores = [e['transition_score'] for e in evaluations
@@ -404,6 +822,17 @@ def main():
         "evaluations": evaluations,
         "ai_score": ai_score,
         "summary": summary,
+        "sampling": sampling,
+        "upload": {
+            "encoding": encoding,
+            "requests": len(pending),
+            "bytes_sent": bytes_sent,
+            "wav_bytes": pcm_bytes,
+        },
+        "cache": {
+            "hits": len(jobs) - len(pending),
+            "requested": len(pending),
+        },
     }
 
     # 保存报告
@@ -417,6 +846,7 @@ def main():
     print(f"音频: {report['audio_file']}")
     print(f"模型: {args.model}")
     print(f"AI 评分: {ai_score} / 10")
+    print(f"上传: {len(pending)} 个请求, {bytes_sent / 1e6:.2f}MB ({encoding}), 缓存命中 {len(jobs) - len(pending)}")
     print()
     print(f"全局采样: {summary['global_clips']} 片段")
     print(f"  ✅ Pass: {summary['pass']}")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+本地 Gemini API stub — 给 ai_listen.py 做测试和并发压测，不花钱、不需要 key
+
+模拟 generateContent 端点：每个请求固定延迟后返回一个合法的评估 JSON
+（按 prompt 判断是全局采样、可疑片段复查还是批量复查——批量时按音频 part 数返回 JSON 数组）。可选 --rpm 模拟限流（超出返回 429），
+退出时打印请求数、429 次数和峰值并发，用来确认调度器的行为。
+
+用法：
+    python3 gemini_stub.py --port 8765 --latency 2.0 --rpm 60
+    python3 ai_listen.py --input podcast.mp3 --output /tmp/qa_ai.json --base-url http://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.stdout.reconfigure(line_buffering=True)
+sys.stderr.reconfigure(line_buffering=True)
+
+GLOBAL_RESPONSE = {"transition_score": 8, "issues": [], "verdict": "pass"}
+SUSPICIOUS_RESPONSE = {
+    "is_real_issue": False,
+    "severity": 0,
+    "explanation": "Stub: natural speaker change",
+    "verdict": "false_positive",
+}
+
+
+class StubState:
+    """请求统计 + 滑动窗口限流（线程安全）"""
+
+    def __init__(self, latency, rpm):
+        self.latency = latency
+        self.rpm = rpm
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.requests = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    def admit(self):
+        """记录一次请求；超过 RPM 返回 False"""
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if self.rpm and len(self.recent) >= self.rpm:
+                self.rejected += 1
+                return False
+            self.recent.append(now)
+            self.requests += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.endswith(":generateContent"):
+                self._send(404, {"error": {"code": 404, "message": f"Unknown path {self.path}", "status": "NOT_FOUND"}})
+                return
+            if not state.admit():
+                self._send(429, {"error": {"code": 429, "message": "Stub RATE_LIMIT exceeded",
+                                           "status": "RESOURCE_EXHAUSTED"}})
+                return
+
+            try:
+                time.sleep(state.latency)
+                parts = [part for content in request.get("contents", []) for part in content.get("parts", [])]
+                texts = [part.get("text", "") for part in parts]
+                n_audio = sum(1 for part in parts if "inlineData" in part or "inline_data" in part)
+                if any("JSON array" in t for t in texts):
+                    answer = [dict(SUSPICIOUS_RESPONSE, clip=n) for n in range(1, n_audio + 1)]
+                elif any("is_real_issue" in t for t in texts):
+                    answer = SUSPICIOUS_RESPONSE
+                else:
+                    answer = GLOBAL_RESPONSE
+                self._send(200, {
+                    "candidates": [{
+                        "content": {"role": "model", "parts": [{"text": json.dumps(answer)}]},
+                        "finishReason": "STOP",
+                    }],
+                })
+            finally:
+                state.release()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini generateContent stub for ai_listen.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.0, help="Seconds per request (default: 2.0)")
+    parser.add_argument("--rpm", type=int, default=0, help="Reject with 429 above this many requests/minute (0 = off)")
+    args = parser.parse_args()
+
+    # 后台运行时用 kill（SIGTERM）停止，同样打印统计
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    state = StubState(args.latency, args.rpm)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Gemini stub listening on http://{args.host}:{args.port} (latency {args.latency}s, rpm {args.rpm or 'unlimited'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\nRequests: {state.requests}, rejected (429): {state.rejected}, peak concurrency: {state.peak}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,18 +11,64 @@ Layer 1: 信号层分析 — 播客剪辑质量检测
 
 无需任何 API Key，纯本地运算。
 
+两级扫描（--coarse）：先用 8kHz + 大帧移粗扫全片，筛出可疑切点；
+再只在候选切点附近跑 22kHz 全精度的 MFCC / ZCR / 呼吸音检测。
+能量突变和静音检测开销很小，仍对所有切点运行。
+
+增量质检（--cache）：按切点缓存检测结果，键为切点前后音频采样 + EDL 条目的哈希。
+改剪后重新导出的版本只分析新增或变化的切点，其余直接复用。
+该模式下切点会对齐到采样级的能量突变位置（不受帧网格错位影响），
+时间戳与非缓存模式可能有 <25ms 差异。缓存键哈希的是解码后的原始采样，
+有损格式重新编码后采样会变，只有编码帧没变的部分能复用。
+
 用法：
     python3 signal_analysis.py --input podcast.mp3 --output qa_report.json
+    python3 signal_analysis.py --input podcast.mp3 --output qa_report.json --coarse
+    python3 signal_analysis.py --input podcast.mp3 --output qa_report.json --workers 4
+    python3 signal_analysis.py --input podcast_v2.mp3 --output qa_report.json \
+        --cache qa_signal_cache.json --edl delete_segments_edited.json
 """
 
 import argparse
+import bisect
+import hashlib
 import json
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
 from pathlib import Path
 
 import librosa
 import numpy as np
 
+ANALYSIS_SR = 22050
+
+# 两级扫描参数
+COARSE_SR = 8000            # 粗扫采样率
+COARSE_HOP = 512            # 粗扫帧移（64ms）
+FINE_CHECKS = {"zcr", "spectral", "breath"}  # 只对候选切点跑的高开销检测
+FINE_WINDOW_S = 0.25        # 细扫范围：候选切点前后各 250ms（ZCR 检测的最大窗口）
+
+# 粗扫筛选阈值（都比细扫阈值宽松，宁可多选不漏）
+COARSE_MFCC_SIM = 0.85      # 细扫 0.7
+COARSE_ZCR_Z = 1.5          # 细扫 2.0
+COARSE_BREATH_RANGE = (0.03, 0.35)  # 细扫 (0.05, 0.25)
+COARSE_BREATH_ASYMMETRY = 0.35      # 细扫 0.5
+
+CHECK_NAMES = ["energy_jump", "silence", "zcr", "spectral", "breath"]
+
+# 增量质检缓存
+CACHE_VERSION = 1
+CACHE_CONTEXT_S = 2.0        # 缓存键覆盖切点前后 2s（= 静音检测的最大窗口）
+EDL_MATCH_TOLERANCE_S = 0.3  # 检测到的切点与 EDL 计划拼接点的匹配容差
+ANCHOR_SEARCH_S = 0.025     # 切点对齐的搜索半径（约一个 hop）
+ANCHOR_SMOOTH_S = 0.006     # 切点对齐用的短时能量窗口
+CACHE_RMS_TOLERANCE_DB = 0.5  # 全片 RMS 变化超过此值时，呼吸音检测结果不复用（它依赖全片 RMS）
+CACHE_TTL_DAYS = 30          # 超过此天数没被用到的切点条目在保存时清理
+CACHE_MAX_ENTRIES = 20000    # 条目数上限，超出时淘汰最久未使用的
+
 
 def detect_cut_points(y, sr, hop_length=512):
     """自动检测音频中的剪切点（基于能量和频谱突变）"""
@@ -76,7 +122,7 @@ def check_energy_jump(y, sr, cut_time, window_ms=100):
             "detail": f"Energy ratio {ratio:.1f}x at cut point",
             "suggestion": "Add 50ms crossfade",
             "listen_range": [round(max(0, cut_time - 2), 1), round(cut_time + 3, 1)],
-            "metric": round(ratio, 2),
+            "metric": round(float(ratio), 2),
         }
     return None
 
@@ -168,7 +214,7 @@ def check_zcr_jump(y, sr, cut_time, window_ms=50):
             "detail": f"Zero-crossing rate jump: z-score {z_score:.1f}",
             "suggestion": "Apply short crossfade at cut point",
             "listen_range": [round(max(0, cut_time - 2), 1), round(cut_time + 3, 1)],
-            "metric": round(z_score, 2),
+            "metric": round(float(z_score), 2),
         }
     return None
 
@@ -204,13 +250,13 @@ def check_spectral_jump(y, sr, cut_time, window_ms=200):
             "detail": f"MFCC cosine similarity {cos_sim:.2f} (threshold: 0.7)",
             "suggestion": "Check for background noise change at cut point",
             "listen_range": [round(max(0, cut_time - 2), 1), round(cut_time + 3, 1)],
-            "metric": round(cos_sim, 3),
+            "metric": round(float(cos_sim), 3),
         }
     return None
 
 
-def check_breath_truncation(y, sr, cut_time, window_ms=150):
-    """检测项 5：呼吸音截断"""
+def check_breath_truncation(y, sr, cut_time, window_ms=150, overall_rms=None):
+    """检测项 5：呼吸音截断（overall_rms 可预先算好传入，避免每个切点扫一遍全片）"""
     window_samples = int(window_ms / 1000 * sr)
     cut_sample = int(cut_time * sr)
 
@@ -224,7 +270,8 @@ def check_breath_truncation(y, sr, cut_time, window_ms=150):
 
     # 呼吸音通常在 200-2000Hz 范围，能量较低
     rms = np.sqrt(np.mean(segment ** 2))
-    overall_rms = np.sqrt(np.mean(y ** 2))
+    if overall_rms is None:
+        overall_rms = np.sqrt(np.mean(y ** 2))
 
     # 呼吸音能量通常是正常语音的 5-20%
     energy_ratio = rms / (overall_rms + 1e-10)
@@ -244,40 +291,391 @@ def check_breath_truncation(y, sr, cut_time, window_ms=150):
                 "detail": f"Possible breath sound truncated at cut point (asymmetry: {asymmetry:.2f})",
                 "suggestion": "Extend cut boundary to include full breath",
                 "listen_range": [round(max(0, cut_time - 1.5), 1), round(cut_time + 1.5, 1)],
-                "metric": round(asymmetry, 3),
+                "metric": round(float(asymmetry), 3),
             }
     return None
 
 
-def analyze(audio_path, output_path=None):
-    """主分析函数"""
-    print(f"Loading audio: {audio_path}")
-    y, sr = librosa.load(audio_path, sr=22050, mono=True)
-    duration = librosa.get_duration(y=y, sr=sr)
-    print(f"Duration: {duration:.1f}s ({duration/60:.1f} min), Sample rate: {sr}Hz")
-
-    # 自动检测剪切点
-    print("Detecting cut points...")
-    cut_points = detect_cut_points(y, sr)
-    print(f"Detected {len(cut_points)} potential cut points")
+def screen_cut_points(y, sr, cut_times, hop_length=COARSE_HOP):
+    """粗扫：在低采样率信号上一次性算出帧级特征，用宽松阈值判断每个切点是否需要细扫
 
-    # 对每个剪切点运行 5 项检测
-    issues = []
+    返回与 cut_times 等长的 bool 列表（True = 需要跑全精度 ZCR/MFCC/呼吸音检测）
+    """
+    rms = librosa.feature.rms(y=y, hop_length=hop_length)[0]
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=hop_length, hop_length=hop_length)[0]
+    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, n_fft=2 * hop_length,
+                                hop_length=hop_length, n_mels=40)
+    overall_rms = np.sqrt(np.mean(y ** 2)) + 1e-10
+    n = len(rms)
+
+    # 各检测项在粗扫帧上的覆盖范围（与细扫窗口对应）
+    k_mfcc = max(1, int(round(0.2 * sr / hop_length)))
+    k_zcr = max(1, int(round(0.25 * sr / hop_length)))
+    k_breath = max(1, int(round(0.15 * sr / hop_length)))
+
+    flags = []
+    for t in cut_times:
+        p = min(int(round(t * sr / hop_length)), n - 1)
+
+        mfcc_b, mfcc_a = mfcc[:, max(0, p - k_mfcc):p], mfcc[:, p:p + k_mfcc]
+        spectral = False
+        if mfcc_b.shape[1] and mfcc_a.shape[1]:
+            mean_b, mean_a = np.mean(mfcc_b, axis=1), np.mean(mfcc_a, axis=1)
+            cos_sim = np.dot(mean_b, mean_a) / (np.linalg.norm(mean_b) * np.linalg.norm(mean_a) + 1e-10)
+            spectral = cos_sim < COARSE_MFCC_SIM
+
+        zcr_b, zcr_a = zcr[max(0, p - k_zcr):p], zcr[p:p + k_zcr]
+        zcr_jump = False
+        if len(zcr_b) and len(zcr_a):
+            z = abs(np.mean(zcr_a) - np.mean(zcr_b)) / (np.std(np.concatenate([zcr_b, zcr_a])) + 1e-10)
+            zcr_jump = z > COARSE_ZCR_Z
+
+        seg = rms[max(0, p - k_breath):p + k_breath]
+        breath = False
+        if len(seg) >= 2:
+            ratio = np.sqrt(np.mean(seg ** 2)) / overall_rms
+            if COARSE_BREATH_RANGE[0] < ratio < COARSE_BREATH_RANGE[1]:
+                mid = len(seg) // 2
+                first, second = np.sqrt(np.mean(seg[:mid] ** 2)), np.sqrt(np.mean(seg[mid:] ** 2))
+                breath = abs(first - second) / (max(first, second) + 1e-10) > COARSE_BREATH_ASYMMETRY
+
+        flags.append(bool(spectral or zcr_jump or breath))
+
+    return flags
+
+
+def merge_windows(times, half_width, duration):
+    """把 [t - half_width, t + half_width] 合并为不重叠区间，返回总时长（秒）"""
+    total = 0.0
+    cur_start = cur_end = None
+    for t in sorted(times):
+        s, e = max(0.0, t - half_width), min(duration, t + half_width)
+        if cur_end is not None and s <= cur_end:
+            cur_end = max(cur_end, e)
+            continue
+        if cur_end is not None:
+            total += cur_end - cur_start
+        cur_start, cur_end = s, e
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+
+def evaluate_cut_points(y, sr, cut_points, overall_rms=None, check_names=None, progress=True):
+    """对每个剪切点运行检测，返回 [{check_name: issue 或 None}, ...]（与 cut_points 一一对应）
+
+    check_names[i] 指定第 i 个切点要跑哪些检测（默认全部 5 项）
+    """
+    if overall_rms is None:
+        overall_rms = np.sqrt(np.mean(y ** 2))
     checks = [
         ("energy_jump", check_energy_jump),
         ("silence", check_silence),
         ("zcr", check_zcr_jump),
         ("spectral", check_spectral_jump),
-        ("breath", check_breath_truncation),
+        ("breath", partial(check_breath_truncation, overall_rms=overall_rms)),
     ]
 
+    results = []
     for i, cut_time in enumerate(cut_points):
-        if (i + 1) % 10 == 0:
+        if progress and (i + 1) % 10 == 0:
             print(f"  Analyzing cut point {i+1}/{len(cut_points)}...")
-        for name, check_fn in checks:
-            result = check_fn(y, sr, cut_time)
-            if result:
-                issues.append(result)
+        names = CHECK_NAMES if check_names is None else check_names[i]
+        results.append({name: check_fn(y, sr, cut_time) for name, check_fn in checks if name in names})
+    return results
+
+
+def flatten_results(results):
+    """把逐切点的检测结果按切点、检测项顺序展开为 issues 列表"""
+    issues = []
+    for cut_results in results:
+        for name in CHECK_NAMES:
+            issue = cut_results.get(name)
+            if issue:
+                issues.append(issue)
+    return issues
+
+
+# 子进程状态：通过共享内存挂载的解码信号，每个 worker 初始化一次
+_worker = {}
+
+
+def _init_worker(shm_name, shape, dtype, sr, overall_rms):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm  # 保持引用，映射在 worker 生命周期内有效
+    _worker["y"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["sr"] = sr
+    _worker["overall_rms"] = overall_rms
+
+
+def _run_shard(shard):
+    cut_points, check_names = shard
+    return evaluate_cut_points(_worker["y"], _worker["sr"], cut_points,
+                               overall_rms=_worker["overall_rms"], check_names=check_names,
+                               progress=False)
+
+
+def evaluate_cut_points_parallel(y, sr, cut_points, workers, overall_rms=None, check_names=None):
+    """把切点分片到进程池并行检测，结果按切点顺序拼回（与 evaluate_cut_points 输出一致）
+
+    解码后的信号放进共享内存，子进程直接映射，不做 pickle 拷贝。
+    """
+    if overall_rms is None:
+        overall_rms = np.sqrt(np.mean(y ** 2))
+    if check_names is None:
+        check_names = [CHECK_NAMES] * len(cut_points)
+
+    # 连续分片，每个 worker 约 4 片，兼顾负载均衡和调度开销
+    n_shards = min(len(cut_points), workers * 4)
+    if n_shards == 0:
+        return []
+    bounds = np.linspace(0, len(cut_points), n_shards + 1).astype(int)
+    shards = [(cut_points[s:e], check_names[s:e]) for s, e in zip(bounds[:-1], bounds[1:]) if e > s]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(y.nbytes, 1))
+    try:
+        np.ndarray(y.shape, dtype=y.dtype, buffer=shm.buf)[:] = y
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shm.name, y.shape, y.dtype.str, sr, overall_rms),
+        ) as pool:
+            results = []
+            for i, shard_results in enumerate(pool.map(_run_shard, shards)):
+                results.extend(shard_results)
+                print(f"  Analyzed shard {i+1}/{len(shards)}")
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def load_keep_segments(edl_path):
+    """从 delete_segments.json 生成保留片段（与 cut_audio.py 相同逻辑，末段到文件结尾）"""
+    with open(edl_path, encoding="utf-8") as f:
+        raw = json.load(f)
+    delete_segs = raw["segments"] if isinstance(raw, dict) and "segments" in raw else raw
+
+    keep_segs = []
+    last_end = 0.0
+    for seg in delete_segs:
+        if seg["start"] > last_end:
+            keep_segs.append((last_end, seg["start"]))
+        last_end = seg["end"]
+    keep_segs.append((last_end, None))
+    return keep_segs
+
+
+def load_planned_splices(edl_path):
+    """计算每个拼接点在成品中的时间，返回 [(output_time, deleted_start, deleted_end), ...]"""
+    keep_segs = load_keep_segments(edl_path)
+    splices = []
+    output_time = 0.0
+    for (start, end), (next_start, _) in zip(keep_segs[:-1], keep_segs[1:]):
+        output_time += end - start
+        splices.append((output_time, end, next_start))
+    return splices
+
+
+def match_splice(splices, cut_time, tolerance=EDL_MATCH_TOLERANCE_S):
+    """找到离 cut_time 最近的计划拼接点（超出容差返回 None）"""
+    if not splices:
+        return None
+    times = [s[0] for s in splices]
+    i = bisect.bisect_left(times, cut_time)
+    best = None
+    for j in (i - 1, i):
+        if 0 <= j < len(splices) and abs(splices[j][0] - cut_time) <= tolerance:
+            if best is None or abs(splices[j][0] - cut_time) < abs(best[0] - cut_time):
+                best = splices[j]
+    return best
+
+
+def anchor_cut_point(y, sr, cut_time, max_iter=8):
+    """把帧网格上的切点对齐到采样级的能量突变位置
+
+    改剪后帧网格会整体错位（删掉的时长不是 hop 的整数倍）。在 ±ANCHOR_SEARCH_S 内取
+    短时能量差最大的采样点，再以它为中心重复搜索直到不动——收敛点只取决于内容本身，
+    未改动的拼接点在新版本里会落在同一段采样上，缓存键才能命中。
+    """
+    search = int(ANCHOR_SEARCH_S * sr)
+    smooth = max(1, int(ANCHOR_SMOOTH_S * sr))
+    center = int(cut_time * sr)
+    for _ in range(max_iter):
+        start = max(0, center - search - smooth)
+        end = min(len(y), center + search + smooth)
+        seg = y[start:end].astype(np.float64)
+        if len(seg) <= 2 * smooth:
+            break
+        csum = np.concatenate([[0.0], np.cumsum(seg ** 2)])
+        energy = (csum[smooth:] - csum[:-smooth]) / smooth      # energy[i] = mean(seg[i:i+smooth]**2)
+        jump = np.abs(energy[smooth:] - energy[:-smooth])       # 以 i + smooth 为界的前后能量差
+        anchor = start + smooth + int(np.argmax(jump))
+        if anchor == center:
+            break
+        center = anchor
+    return center / sr
+
+
+def splice_cache_key(y, sr, cut_time, splice=None):
+    """缓存键：切点前后 CACHE_CONTEXT_S 的采样 + 对应的 EDL 条目"""
+    context = int(CACHE_CONTEXT_S * sr)
+    cut_sample = int(cut_time * sr)
+    start = max(0, cut_sample - context)
+    end = min(len(y), cut_sample + context)
+
+    h = hashlib.sha1()
+    edl_entry = None if splice is None else [round(splice[1], 3), round(splice[2], 3)]
+    h.update(json.dumps([CACHE_VERSION, sr, cut_sample - start, edl_entry]).encode())
+    h.update(np.ascontiguousarray(y[start:end]).tobytes())
+    return h.hexdigest()
+
+
+def rebase_issue(issue, cut_time):
+    """缓存命中时把 issue 的时间字段换算到本次的切点位置（公式与各检测函数一致）"""
+    before, after = (1.5, 1.5) if issue["type"] == "breath_truncation" else (2, 3)
+    issue = dict(issue)
+    issue["timestamp"] = round(cut_time, 2)
+    issue["listen_range"] = [round(max(0, cut_time - before), 1), round(cut_time + after, 1)]
+    return issue
+
+
+def load_qa_cache(cache_path):
+    if cache_path and Path(cache_path).exists():
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == CACHE_VERSION:
+            return cache.get("splices", {})
+    return {}
+
+
+def save_qa_cache(cache_path, entries):
+    """写回缓存：清理超过 CACHE_TTL_DAYS 没用到的条目，超出 CACHE_MAX_ENTRIES 时淘汰最久未使用的"""
+    now = time.time()
+    for entry in entries.values():
+        entry.setdefault("last_used", now)  # 旧版本条目没有使用时间：从这次开始计
+    live = {k: e for k, e in entries.items() if now - e["last_used"] <= CACHE_TTL_DAYS * 86400}
+    if len(live) > CACHE_MAX_ENTRIES:
+        keep = sorted(live, key=lambda k: live[k]["last_used"], reverse=True)[:CACHE_MAX_ENTRIES]
+        live = {k: live[k] for k in keep}
+    tmp = Path(cache_path).with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "splices": live}, f, ensure_ascii=False)
+    tmp.replace(cache_path)
+
+
+def analyze(audio_path, output_path=None, coarse=False, workers=1, cache_path=None, edl_path=None):
+    """主分析函数"""
+    print(f"Loading audio: {audio_path}")
+    if cache_path:
+        # 增量模式的缓存键基于原采样率的解码采样（重采样的浮点误差会让哈希失配）
+        y_native, native_sr = librosa.load(audio_path, sr=None, mono=True)
+        y = librosa.resample(y_native, orig_sr=native_sr, target_sr=ANALYSIS_SR)
+        sr = ANALYSIS_SR
+    else:
+        y, sr = librosa.load(audio_path, sr=ANALYSIS_SR, mono=True)
+    duration = librosa.get_duration(y=y, sr=sr)
+    print(f"Duration: {duration:.1f}s ({duration/60:.1f} min), Sample rate: {sr}Hz")
+
+    # 自动检测剪切点（全精度 RMS 差分，向量化运算，开销很小）
+    print("Detecting cut points...")
+    cut_points = detect_cut_points(y, sr)
+    if cache_path:
+        # 增量模式下切点对齐到采样级内容锚点，改剪后未变的拼接点才能命中缓存
+        cut_points = [anchor_cut_point(y_native, native_sr, t) for t in cut_points]
+    print(f"Detected {len(cut_points)} potential cut points")
+
+    check_names = [CHECK_NAMES] * len(cut_points)
+    if coarse:
+        # Tier 1: 8kHz 粗扫，筛出需要全精度 ZCR/MFCC/呼吸音检测的切点
+        print(f"Coarse scan at {COARSE_SR}Hz (hop {COARSE_HOP})...")
+        y_coarse = librosa.resample(y, orig_sr=sr, target_sr=COARSE_SR, res_type="soxr_qq")
+        fine_flags = screen_cut_points(y_coarse, COARSE_SR, cut_points, COARSE_HOP)
+        cheap_names = [n for n in CHECK_NAMES if n not in FINE_CHECKS]
+        check_names = [CHECK_NAMES if flag else cheap_names for flag in fine_flags]
+        fine_points = [t for t, flag in zip(cut_points, fine_flags) if flag]
+        print(f"{len(fine_points)}/{len(cut_points)} cut points flagged for fine scan")
+    else:
+        fine_points = cut_points
+
+    # Tier 2: 全精度检测只覆盖候选切点 ±FINE_WINDOW_S
+    scan = {
+        "mode": "coarse_to_fine" if coarse else "full",
+        "fine": {
+            "sample_rate": sr,
+            "checks": sorted(FINE_CHECKS),
+            "window_seconds": FINE_WINDOW_S,
+            "cut_points": len(fine_points),
+            "audio_seconds": round(merge_windows(fine_points, FINE_WINDOW_S, duration), 1),
+        },
+    }
+    if coarse:
+        scan["coarse"] = {
+            "sample_rate": COARSE_SR,
+            "hop_length": COARSE_HOP,
+            "cut_points": len(cut_points),
+            "audio_seconds": round(len(y_coarse) / COARSE_SR, 1),
+        }
+
+    overall_rms = np.sqrt(np.mean(y ** 2))
+    overall_db = round(float(20 * np.log10(overall_rms + 1e-10)), 2)
+
+    # 增量质检：命中缓存的检测项直接复用，只跑缺失的
+    results = [{} for _ in cut_points]
+    pending = list(range(len(cut_points)))
+    keys = None
+    if cache_path:
+        cache = load_qa_cache(cache_path)
+        splices = load_planned_splices(edl_path) if edl_path else []
+        keys = [splice_cache_key(y_native, native_sr, t, match_splice(splices, t)) for t in cut_points]
+        pending = []
+        for i, (t, key) in enumerate(zip(cut_points, keys)):
+            entry = cache.get(key, {})
+            cached = dict(entry.get("checks", {}))
+            if abs(entry.get("overall_db", overall_db) - overall_db) > CACHE_RMS_TOLERANCE_DB:
+                cached.pop("breath", None)
+            for name in check_names[i]:
+                if name in cached:
+                    results[i][name] = rebase_issue(cached[name], t) if cached[name] else None
+            if any(name not in results[i] for name in check_names[i]):
+                pending.append(i)
+
+    # 对剩余切点运行检测
+    pending_points = [cut_points[i] for i in pending]
+    pending_names = [[n for n in check_names[i] if n not in results[i]] for i in pending]
+    if workers > 1 and len(pending_points) > 1:
+        print(f"Running checks on {len(pending_points)} cut points with {workers} workers...")
+        computed = evaluate_cut_points_parallel(y, sr, pending_points, workers,
+                                                overall_rms=overall_rms, check_names=pending_names)
+    else:
+        computed = evaluate_cut_points(y, sr, pending_points, overall_rms=overall_rms,
+                                       check_names=pending_names)
+    for i, cut_results in zip(pending, computed):
+        results[i].update(cut_results)
+
+    total_checks = sum(len(names) for names in check_names)
+    recomputed_checks = sum(len(names) for names in pending_names)
+    cache_stats = None
+    if cache_path:
+        # 与已有条目合并：本次没覆盖到的切点（EDL 范围更窄、粗扫跳过的检测项）保留原结果
+        now = time.time()
+        for key, cut_results in zip(keys, results):
+            entry = cache.setdefault(key, {"overall_db": overall_db, "checks": {}})
+            if abs(entry.get("overall_db", overall_db) - overall_db) > CACHE_RMS_TOLERANCE_DB:
+                entry["checks"].pop("breath", None)  # 旧 RMS 下的呼吸音结果已失效
+            entry["overall_db"] = overall_db
+            entry["checks"].update(cut_results)
+            entry["last_used"] = now
+        save_qa_cache(cache_path, cache)
+        cache_stats = {
+            "reused_checks": total_checks - recomputed_checks,
+            "recomputed_checks": recomputed_checks,
+            "recomputed_cut_points": len(pending),
+        }
+        print(f"Cache: reused {cache_stats['reused_checks']} checks, "
+              f"recomputed {recomputed_checks} ({len(pending)}/{len(cut_points)} cut points)")
+
+    issues = flatten_results(results)
 
     # 去重（同一时间点的多个问题保留最严重的）
     seen_times = {}
@@ -301,6 +699,7 @@ def analyze(audio_path, output_path=None):
         "audio_file": str(Path(audio_path).name),
         "duration_seconds": round(duration, 1),
         "detected_cut_points": len(cut_points),
+        "cut_times": [round(float(t), 3) for t in cut_points],
         "issues": issues,
         "signal_score": score,
         "summary": {
@@ -310,7 +709,10 @@ def analyze(audio_path, output_path=None):
             "low": low_count,
             "pass_rate": round((len(cut_points) - len(issues)) / max(len(cut_points), 1) * 100, 1),
         },
+        "scan": scan,
     }
+    if cache_stats:
+        report["cache"] = cache_stats
 
     # 输出
     if output_path:
@@ -325,6 +727,11 @@ def analyze(audio_path, output_path=None):
     print(f"Audio: {report['audio_file']}")
     print(f"Duration: {duration/60:.1f} min")
     print(f"Cut points detected: {len(cut_points)}")
+    if coarse:
+        print(f"Coarse tier: {scan['coarse']['audio_seconds']:.1f}s @ {COARSE_SR}Hz")
+        print(f"Fine tier:   {scan['fine']['audio_seconds']:.1f}s @ {sr}Hz "
+              f"({scan['fine']['audio_seconds'] / max(duration, 1e-9) * 100:.1f}% of audio, "
+              f"{len(fine_points)}/{len(cut_points)} cut points)")
     print(f"Issues found: {len(issues)} (HIGH: {high_count}, MEDIUM: {medium_count}, LOW: {low_count})")
     print(f"Signal Score: {score} / 10")
     print(f"Pass Rate: {report['summary']['pass_rate']}%")
@@ -343,13 +750,20 @@ def main():
     parser = argparse.ArgumentParser(description="Podcast edit signal analysis (Layer 1)")
     parser.add_argument("--input", "-i", required=True, help="Input audio file path")
     parser.add_argument("--output", "-o", help="Output JSON report path")
+    parser.add_argument("--coarse", action="store_true",
+                        help="Two-tier scan: 8kHz coarse pass, full-resolution checks only around candidates")
+    parser.add_argument("--workers", "-j", type=int, default=1,
+                        help="Parallel worker processes for per-cut checks (default: 1)")
+    parser.add_argument("--cache", help="Per-splice QA cache JSON; reuse results for unchanged splices")
+    parser.add_argument("--edl", help="delete_segments JSON used for this export (folded into cache keys)")
     args = parser.parse_args()
 
     if not Path(args.input).exists():
         print(f"Error: File not found: {args.input}", file=sys.stderr)
         sys.exit(1)
 
-    analyze(args.input, args.output)
+    analyze(args.input, args.output, coarse=args.coarse, workers=max(1, args.workers),
+            cache_path=args.cache, edl_path=args.edl)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+渲染前拼接点质检 — 在剪辑出成品之前预测每个拼接点的信号问题
+
+直接从原始音频 + delete_segments（EDL）拼出每个计划拼接点前后各 2s：
+上一个保留段的结尾 + 下一个保留段的开头（按 cut_audio.py 的自适应淡入淡出处理），
+再跑 signal_analysis.py 的 5 项检测（能量突变 / 不自然静音 / 波形不连续 / 频谱跳变 / 呼吸音截断）。
+
+不需要先渲染、编码、再跑一遍 Layer 1：坏的拼接点几秒内就能发现并回到审核页修正。
+
+用法：
+    python3 splice_preflight.py --audio ../1_转录/audio_original.wav \\
+        --edl delete_segments_edited.json --output splice_preflight.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from signal_analysis import (
+    ANALYSIS_SR,
+    CHECK_NAMES,
+    evaluate_cut_points,
+    load_keep_segments,
+    rebase_issue,
+)
+
+SEVERITY_ORDER = {"high": 3, "medium": 2, "low": 1}
+PREFLIGHT_WINDOW_S = 2.0  # 每个拼接点前后各渲染 2s（= 静音检测的最大窗口）
+
+
+def calc_fade_duration(segment_duration):
+    """自适应淡入淡出时长（与 cut_audio.py 保持一致）"""
+    if segment_duration < 0.3:
+        return 0.0
+    fade = min(segment_duration * 0.08, 0.04)
+    return max(fade, 0.03)
+
+
+def keep_fades(keep_segs, no_fade=False):
+    """按 cut_audio.py 的规则计算每个保留段的 (fade_in, fade_out) 秒数"""
+    fades = []
+    for i, (start, end) in enumerate(keep_segs):
+        seg_dur = end - start
+        is_first, is_last = i == 0, i == len(keep_segs) - 1
+        if no_fade:
+            fade_in = 0.0 if is_first else 0.003
+            fade_out = 0.0 if is_last else 0.003
+        else:
+            fade_in = 0.0 if is_first else calc_fade_duration(seg_dur)
+            fade_out = 0.0 if is_last else calc_fade_duration(seg_dur)
+        if fade_in + fade_out > seg_dur * 0.6:
+            ratio = (seg_dur * 0.6) / (fade_in + fade_out)
+            fade_in *= ratio
+            fade_out *= ratio
+        fades.append((fade_in, fade_out))
+    return fades
+
+
+class OriginalAudio:
+    """按需读取原始音频（soundfile 能 seek 的格式只读需要的窗口，否则整段解码一次）"""
+
+    def __init__(self, path, sr=ANALYSIS_SR):
+        self.sr = sr
+        try:
+            self._file = sf.SoundFile(path)
+            self._y = None
+            self.duration = self._file.frames / self._file.samplerate
+        except RuntimeError:
+            self._file = None
+            self._y, _ = librosa.load(path, sr=sr, mono=True)
+            self.duration = len(self._y) / sr
+
+    def read(self, start, end):
+        """读取 [start, end) 秒，返回 ANALYSIS_SR 单声道 float32"""
+        if self._file is None:
+            return self._y[int(start * self.sr):int(end * self.sr)]
+        native_sr = self._file.samplerate
+        self._file.seek(int(start * native_sr))
+        data = self._file.read(int(end * native_sr) - int(start * native_sr), dtype="float32", always_2d=True)
+        mono = data.mean(axis=1)
+        if native_sr != self.sr:
+            mono = librosa.resample(mono, orig_sr=native_sr, target_sr=self.sr)
+        return mono
+
+    def rms(self, ranges, block_seconds=30.0):
+        """保留段整体 RMS（= 成品的全片 RMS，呼吸音检测需要），分块读取不占整段内存"""
+        total, count = 0.0, 0
+        for start, end in ranges:
+            t = start
+            while t < end:
+                block = self.read(t, min(end, t + block_seconds)).astype(np.float64)
+                total += float(np.sum(block ** 2))
+                count += len(block)
+                t += block_seconds
+        return np.float32(np.sqrt(total / max(count, 1)))
+
+
+def render_window(audio, keep_segs, fades, out_start, out_end):
+    """按 EDL 拼出成品时间轴上 [out_start, out_end) 的音频（含淡入淡出）"""
+    pieces = []
+    out_t = 0.0
+    for (start, end), (fade_in, fade_out) in zip(keep_segs, fades):
+        seg_dur = end - start
+        lo, hi = max(out_start, out_t), min(out_end, out_t + seg_dur)
+        if hi > lo:
+            src_lo = start + (lo - out_t)
+            piece = audio.read(src_lo, src_lo + (hi - lo)).astype(np.float32)
+            # 片段内相对时间 → 淡入淡出增益（线性，对应 ffmpeg afade 默认曲线）
+            rel = (lo - out_t) + np.arange(len(piece)) / audio.sr
+            gain = np.ones(len(piece), dtype=np.float32)
+            if fade_in > 0:
+                gain *= np.clip(rel / fade_in, 0.0, 1.0)
+            if fade_out > 0:
+                gain *= np.clip((seg_dur - rel) / fade_out, 0.0, 1.0)
+            pieces.append(piece * gain)
+        out_t += seg_dur
+        if out_t >= out_end:
+            break
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+
+
+def preflight(audio_path, edl_path, output_path=None, no_fade=False):
+    print(f"Loading original audio: {audio_path}")
+    audio = OriginalAudio(audio_path)
+    keep_segs = load_keep_segments(edl_path)
+    keep_segs[-1] = (keep_segs[-1][0], audio.duration)
+    keep_segs = [(s, e) for s, e in keep_segs if e > s]
+    fades = keep_fades(keep_segs, no_fade)
+    output_duration = sum(e - s for s, e in keep_segs)
+    print(f"Source: {audio.duration:.1f}s, planned output: {output_duration:.1f}s, "
+          f"{len(keep_segs) - 1} splices")
+
+    overall_rms = audio.rms(keep_segs)
+
+    splices = []
+    issues = []
+    out_t = 0.0
+    for i in range(len(keep_segs) - 1):
+        out_t += keep_segs[i][1] - keep_segs[i][0]
+        if (i + 1) % 50 == 0:
+            print(f"  Checking splice {i+1}/{len(keep_segs) - 1}...")
+
+        win_start = max(0.0, out_t - PREFLIGHT_WINDOW_S)
+        window = render_window(audio, keep_segs, fades, win_start, out_t + PREFLIGHT_WINDOW_S)
+        results = evaluate_cut_points(window, audio.sr, [out_t - win_start],
+                                      overall_rms=overall_rms, progress=False)[0]
+
+        splice_issues = [rebase_issue(results[name], out_t) for name in CHECK_NAMES if results.get(name)]
+        for issue in splice_issues:
+            issue["source"] = {"keep_end": round(keep_segs[i][1], 3), "next_keep_start": round(keep_segs[i + 1][0], 3)}
+        issues.extend(splice_issues)
+        splices.append({
+            "index": i,
+            "output_time": round(out_t, 3),
+            "deleted": [round(keep_segs[i][1], 3), round(keep_segs[i + 1][0], 3)],
+            "issues": [issue["type"] for issue in splice_issues],
+        })
+
+    high_count = sum(1 for i in issues if i["severity"] == "high")
+    medium_count = sum(1 for i in issues if i["severity"] == "medium")
+    low_count = sum(1 for i in issues if i["severity"] == "low")
+    flagged = sum(1 for s in splices if s["issues"])
+
+    report = {
+        "audio_file": str(Path(audio_path).name),
+        "edl_file": str(Path(edl_path).name),
+        "source_duration_seconds": round(audio.duration, 1),
+        "output_duration_seconds": round(output_duration, 1),
+        "planned_splices": len(splices),
+        "splices": splices,
+        "issues": issues,
+        "summary": {
+            "total_issues": len(issues),
+            "high": high_count,
+            "medium": medium_count,
+            "low": low_count,
+            "flagged_splices": flagged,
+            "pass_rate": round((len(splices) - flagged) / max(len(splices), 1) * 100, 1),
+        },
+    }
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport saved: {output_path}")
+
+    print(f"\n{'='*50}")
+    print(f"Splice Preflight Report")
+    print(f"{'='*50}")
+    print(f"Planned splices: {len(splices)}, flagged: {flagged}")
+    print(f"Issues: {len(issues)} (HIGH: {high_count}, MEDIUM: {medium_count}, LOW: {low_count})")
+
+    worst = {}
+    for issue in issues:
+        t = issue["timestamp"]
+        if t not in worst or SEVERITY_ORDER[issue["severity"]] > SEVERITY_ORDER[worst[t]["severity"]]:
+            worst[t] = issue
+    if worst:
+        print(f"\nSplices to fix before rendering:")
+        for n, issue in enumerate(sorted(worst.values(), key=lambda x: x["timestamp"]), 1):
+            mins, secs = divmod(issue["timestamp"], 60)
+            src = issue["source"]
+            print(f"  {n}. [{int(mins):02d}:{secs:05.2f}] {issue['type']} ({issue['severity']}) — "
+                  f"{issue['detail']} (source {src['keep_end']:.2f}s → {src['next_keep_start']:.2f}s)")
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict splice QA issues from the original audio and EDL")
+    parser.add_argument("--audio", "-a", required=True, help="Original (unedited) audio path")
+    parser.add_argument("--edl", "-e", required=True, help="delete_segments JSON")
+    parser.add_argument("--output", "-o", help="Output JSON report path")
+    parser.add_argument("--no-fade", action="store_true", help="Model cut_audio.py --no-fade (3ms micro fades)")
+    args = parser.parse_args()
+
+    for path in (args.audio, args.edl):
+        if not Path(path).exists():
+            print(f"Error: File not found: {path}", file=sys.stderr)
+            sys.exit(1)
+
+    preflight(args.audio, args.edl, args.output, no_fade=args.no_fade)
+
+
+if __name__ == "__main__":
+    main()
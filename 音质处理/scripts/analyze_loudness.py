@@ -9,23 +9,37 @@
     --speaker-mapping speaker_mapping.json \
     --output loudness_report.json
 
-输出 JSON 包含：整体 LUFS、各说话人 LUFS、偏差、建议增益。
+输出 JSON 包含：整体 LUFS、响度范围（LRA）、各说话人 LUFS、偏差、建议增益。
+另输出响度时间线（默认 <output>_timeline.bin）：momentary（400ms）和 short-term（3s）
+两条 100ms 步长的 LUFS 序列，格式见 write_timeline()。
+
+整段只做一次 K 加权：按 100ms 分帧累加能量，400ms / 75% 重叠的门限块由帧能量
+滑动求和得到。任意说话人（或任意一组时间段）的 integrated LUFS 只需按时间段
+选出门限块再做 BS.1770 门限，不再拼接音频、重复滤波。
 """
 
 import argparse
 import json
+import struct
 import sys
-import subprocess
-import tempfile
 import os
 from collections import defaultdict
 
 import numpy as np
-import soundfile as sf
+
+from audio_io import decode_audio
+from bs1770 import (
+    BLOCK_S, BLOCK_HOP_S, ABS_GATE_LUFS,
+    k_weighting_filters, filter_states, k_weight, window_mean_square, gated_lufs, ranges_block_mask,
+)
 
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
 
+SHORT_TERM_S = 3.0   # EBU R128 short-term 窗口
+LRA_REL_GATE_LU = -20.0
+TIMELINE_MAGIC = b'LUFSTL01'
+
 
 def load_speaker_segments(words_path, mapping_path):
     """从 subtitles_words.json 提取每个说话人的连续时间段。"""
@@ -69,35 +83,88 @@ def load_speaker_segments(words_path, mapping_path):
     return dict(speaker_segments)
 
 
-def decode_audio(audio_path):
-    """解码音频为 numpy array + sample rate。"""
-    tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    tmp.close()
-    try:
-        subprocess.run([
-            'ffmpeg', '-i', audio_path, '-vn', '-acodec', 'pcm_s16le',
-            '-ar', '48000', '-ac', '1', '-y', tmp.name
-        ], capture_output=True, check=True)
-        data, sr = sf.read(tmp.name)
-        return data, sr
-    finally:
-        os.unlink(tmp.name)
-
-
-def measure_lufs(samples, sr):
-    """测量 integrated LUFS（ITU-R BS.1770-4）。"""
+def k_weighted_hop_energy(samples, sr, hop_s=BLOCK_HOP_S, chunk_s=60.0):
+    """
+    K 加权（ITU-R BS.1770-4）后按 hop_s 分帧求平方和，多声道能量相加。
+
+    按 chunk_s 分块带状态滤波，不生成整段 K 加权副本。
+    返回 (每帧能量, 每帧采样数)，末尾不足一帧的采样忽略；未安装 pyloudnorm 时返回 None。
+    """
     try:
-        import pyloudnorm as pyln
-        meter = pyln.Meter(sr)
-        # pyloudnorm 需要至少 0.4 秒
-        if len(samples) < sr * 0.4:
-            return None
-        lufs = meter.integrated_loudness(samples)
-        if np.isinf(lufs) or np.isnan(lufs):
-            return None
-        return round(lufs, 1)
-    except Exception:
+        filters = k_weighting_filters(sr)
+    except ImportError:
         return None
+    hop = int(round(sr * hop_s))
+    x = samples if samples.ndim == 2 else samples[:, None]
+    n_hops = x.shape[0] // hop
+    energy = np.zeros(n_hops)
+    states = [filter_states(filters) for _ in range(x.shape[1])]
+
+    chunk = max(1, int(round(chunk_s / hop_s))) * hop
+    for pos in range(0, n_hops * hop, chunk):
+        end = min(pos + chunk, n_hops * hop)
+        for ch in range(x.shape[1]):
+            y = k_weight(x[pos:end, ch], filters, states[ch])
+            energy[pos // hop:end // hop] += np.square(y).reshape(-1, hop).sum(axis=1)
+
+    return energy, hop
+
+
+def block_loudness(block_z, floor=ABS_GATE_LUFS):
+    """均方能量 → LUFS，低于 floor（默认 -70）的记为 floor，方便绘图"""
+    with np.errstate(divide='ignore'):
+        return np.maximum(-0.691 + 10 * np.log10(block_z), floor)
+
+
+def loudness_range(short_term_z):
+    """EBU Tech 3342 响度范围（LU）：short-term 序列经 -70 绝对门限、-20 LU 相对门限后的 P95 - P10"""
+    if len(short_term_z) == 0:
+        return None
+    with np.errstate(divide='ignore'):
+        st = -0.691 + 10 * np.log10(short_term_z)
+    gated = st >= ABS_GATE_LUFS
+    if not gated.any():
+        return None
+    rel_gate = -0.691 + 10 * np.log10(short_term_z[gated].mean()) + LRA_REL_GATE_LU
+    st = st[gated & (st >= rel_gate)]
+    low, high = np.percentile(st, [10, 95])
+    return round(float(high - low), 1)
+
+
+def write_timeline(path, series, hop_s=BLOCK_HOP_S, extra=None):
+    """
+    写响度时间线：8 字节 magic 'LUFSTL01' + 4 字节小端 JSON 头长度 + JSON 头 + 各序列 float32 小端数据。
+
+    JSON 头: {"hop_seconds", "series": [{"name", "window_seconds", "count", "offset"}...], ...extra}
+    offset 是数据区内的字节偏移；第 i 个值对应窗口 [i*hop, i*hop + window)。
+    """
+    entries, offset = [], 0
+    for name, window_s, values in series:
+        entries.append({"name": name, "window_seconds": window_s, "count": len(values), "offset": offset})
+        offset += len(values) * 4
+    header = {"hop_seconds": hop_s, "unit": "LUFS", "dtype": "float32le", "series": entries, **(extra or {})}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(TIMELINE_MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for _, _, values in series:
+            f.write(np.asarray(values, dtype='<f4').tobytes())
+
+
+def read_timeline(path):
+    """读响度时间线，返回 (header, {name: np.ndarray})"""
+    with open(path, 'rb') as f:
+        if f.read(8) != TIMELINE_MAGIC:
+            raise ValueError(f"不是响度时间线文件: {path}")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len))
+        data = f.read()
+    series = {
+        s['name']: np.frombuffer(data, dtype='<f4', count=s['count'], offset=s['offset'])
+        for s in header['series']
+    }
+    return header, series
 
 
 def format_duration(seconds):
@@ -114,6 +181,7 @@ def main():
     parser.add_argument('--speaker-mapping', required=True, help='speaker_mapping.json 路径')
     parser.add_argument('--output', required=True, help='输出 JSON 路径')
     parser.add_argument('--target-lufs', type=float, default=-16.0, help='目标 LUFS（默认 -16）')
+    parser.add_argument('--timeline', help='响度时间线输出路径（默认 <output>_timeline.bin）')
     args = parser.parse_args()
 
     print(f"📊 开始响度分析: {args.audio}")
@@ -124,10 +192,19 @@ def main():
     total_duration = len(audio_data) / sr
     print(f"   采样率: {sr}Hz, 时长: {format_duration(total_duration)}")
 
-    # 2. 整体 LUFS
+    # 2. K 加权 + 门限块能量（全片只算一次），整体 LUFS
     print("   测量整体响度...")
-    overall_lufs = measure_lufs(audio_data, sr)
-    print(f"   整体 LUFS: {overall_lufs}")
+    weighted = k_weighted_hop_energy(audio_data, sr)
+    if weighted is None:
+        print("   ⚠️ pyloudnorm 未安装，无法测量 LUFS")
+        weighted = (np.zeros(0), 1)
+    hop_energy, hop_len = weighted
+    block_z = window_mean_square(hop_energy, hop_len, int(round(BLOCK_S / BLOCK_HOP_S)))
+    overall_lufs = gated_lufs(block_z)
+    overall_lufs = round(overall_lufs, 1) if overall_lufs is not None else None
+    short_term_z = window_mean_square(hop_energy, hop_len, int(round(SHORT_TERM_S / BLOCK_HOP_S)))
+    lra = loudness_range(short_term_z)
+    print(f"   整体 LUFS: {overall_lufs}, LRA: {lra} LU")
 
     # 3. 加载说话人时间段
     print("   加载说话人时间段...")
@@ -138,24 +215,17 @@ def main():
     for speaker, segments in sorted(speaker_segments.items()):
         print(f"   分析说话人: {speaker} ({len(segments)} 段)")
 
-        # 拼接该说话人的所有音频段
-        speaker_samples = []
-        total_speaker_dur = 0.0
-        for seg_start, seg_end in segments:
-            s_idx = int(seg_start * sr)
-            e_idx = int(seg_end * sr)
-            s_idx = max(0, min(s_idx, len(audio_data)))
-            e_idx = max(0, min(e_idx, len(audio_data)))
-            if e_idx > s_idx:
-                speaker_samples.append(audio_data[s_idx:e_idx])
-                total_speaker_dur += seg_end - seg_start
-
-        if not speaker_samples:
+        total_speaker_dur = sum(
+            max(0.0, min(seg_end, total_duration) - max(seg_start, 0.0))
+            for seg_start, seg_end in segments)
+
+        if total_speaker_dur <= 0:
             print(f"   ⚠️ {speaker}: 没有有效音频段")
             continue
 
-        combined = np.concatenate(speaker_samples)
-        speaker_lufs = measure_lufs(combined, sr)
+        # 只选出该说话人时间段内的门限块，不拼接音频
+        speaker_lufs = gated_lufs(block_z[ranges_block_mask(len(block_z), segments)])
+        speaker_lufs = round(speaker_lufs, 1) if speaker_lufs is not None else None
 
         if speaker_lufs is None:
             print(f"   ⚠️ {speaker}: 音频太短，无法测量 LUFS")
@@ -181,10 +251,22 @@ def main():
         "target_lufs": args.target_lufs,
         "total_duration": format_duration(total_duration),
         "total_duration_seconds": round(total_duration, 1),
+        "loudness_range_lu": lra,
         "speakers": speakers_report
     }
 
     os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    # 6. 响度时间线（momentary / short-term，同一组帧能量滑动求和）
+    timeline_path = args.timeline or os.path.splitext(args.output)[0] + '_timeline.bin'
+    write_timeline(timeline_path, [
+        ("momentary", BLOCK_S, block_loudness(block_z)),
+        ("short_term", SHORT_TERM_S, block_loudness(short_term_z)),
+    ], extra={"integrated_lufs": overall_lufs, "loudness_range_lu": lra})
+    # 相对报告文件所在目录的路径，报告和时间线一起移动也能找到
+    report["timeline"] = os.path.relpath(os.path.abspath(timeline_path),
+                                         os.path.dirname(os.path.abspath(args.output)))
+
     with open(args.output, 'w', encoding='utf-8') as f:
         json.dump(report, f, ensure_ascii=False, indent=2)
 
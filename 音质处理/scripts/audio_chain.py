@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+单进程音质处理链：解码一次 → 降噪 → 按说话人增益 → 响度标准化 → true-peak limiter → 编码一次。
+
+等价于依次运行 process_speaker.py 和 normalize_loudness.py，但音频全程留在内存里：
+省掉中间 MP3 的两次编解码（和它们的代际损失），最终 LUFS 直接在编码前的缓冲区上测量，
+不再为了验证重新解码输出文件。
+
+用法:
+  python3 audio_chain.py \
+    --audio podcast.mp3 \
+    --words subtitles_words.json \
+    --speaker-mapping speaker_mapping.json \
+    --speakers "阿司" \
+    --loudness-report loudness_report.json \
+    --music-segments music_segments.json \
+    --output audio_processed.mp3 \
+    --bitrate 192k
+
+  # 不降噪，只做增益补偿 + 标准化
+  python3 audio_chain.py \
+    --audio podcast.mp3 \
+    --words subtitles_words.json \
+    --speaker-mapping speaker_mapping.json \
+    --loudness-report loudness_report.json \
+    --output audio_processed.mp3
+"""
+
+import argparse
+import json
+import sys
+import shutil
+import os
+
+import numpy as np
+
+from audio_io import decode_audio, encode_output
+from process_speaker import (
+    load_speaker_segments, collect_target_segments, screen_segments_by_snr, denoise_segments,
+)
+from normalize_loudness import (
+    load_music_ranges, speaker_gain_envelope,
+    apply_gain_envelope, normalize_in_memory, format_time,
+)
+
+sys.stdout.reconfigure(line_buffering=True)
+sys.stderr.reconfigure(line_buffering=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='单进程音质处理链：降噪 → 增益 → 标准化 → limiter → 编码')
+    parser.add_argument('--audio', required=True, help='输入音频路径')
+    parser.add_argument('--words', required=True, help='subtitles_words.json 路径')
+    parser.add_argument('--speaker-mapping', required=True, help='speaker_mapping.json 路径')
+    parser.add_argument('--speakers', help='要降噪的说话人（逗号分隔，不填则跳过降噪）')
+    parser.add_argument('--loudness-report', help='loudness_report.json 路径（不填则跳过按说话人补偿）')
+    parser.add_argument('--music-segments', help='music_segments.json 路径（降噪和增益补偿都跳过音乐段）')
+    parser.add_argument('--target-lufs', type=float, default=-16.0, help='目标 LUFS（默认 -16）')
+    parser.add_argument('--output', required=True, help='输出音频路径')
+    parser.add_argument('--bitrate', default='192k', help='输出码率（默认 192k）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='DeepFilterNet 并行进程数（Python API 时每个进程加载一次模型，默认 1）')
+    parser.add_argument('--snr-threshold', type=float,
+                        help='只降噪 SNR 低于此值（dB）的段落，干净段落保持原声（不填则全部降噪）')
+    parser.add_argument('--cache-dir', help='降噪缓存目录（默认 --output 同目录的 denoise_cache/）')
+    parser.add_argument('--no-cache', action='store_true', help='不读写降噪缓存，全部重新处理')
+    args = parser.parse_args()
+
+    print(f"🎛️ 开始音质处理链")
+    print(f"   输入: {args.audio}")
+    print(f"   目标: {args.target_lufs} LUFS")
+
+    # 1. 解码（整条链只解码这一次）
+    print("   解码音频...")
+    audio_data, sr = decode_audio(args.audio)
+    total_samples = len(audio_data)
+    print(f"   采样率: {sr}Hz, 时长: {format_time(total_samples / sr)}")
+
+    speaker_segments = load_speaker_segments(args.words, args.speaker_mapping)
+    music_ranges = load_music_ranges(args.music_segments)
+    if music_ranges:
+        print(f"   已加载 {len(music_ranges)} 个音乐段，处理时将跳过")
+
+    # 2. 按说话人降噪
+    if args.speakers:
+        target_speakers = [s.strip() for s in args.speakers.split(',')]
+        segments_to_process = collect_target_segments(speaker_segments, target_speakers, music_ranges)
+        if args.snr_threshold is not None and segments_to_process:
+            segments_to_process = screen_segments_by_snr(audio_data, sr, segments_to_process, args.snr_threshold)
+        total_process_dur = sum(e - s for s, e, _ in segments_to_process)
+        print(f"   降噪 {', '.join(target_speakers)}: 共 {len(segments_to_process)} 段，"
+              f"总计 {format_time(total_process_dur)}")
+        if segments_to_process:
+            output_dir = os.path.dirname(os.path.abspath(args.output))
+            cache_dir = None
+            if not args.no_cache:
+                cache_dir = args.cache_dir or os.path.join(output_dir, 'denoise_cache')
+            audio_data = denoise_segments(audio_data, sr, segments_to_process, workers=max(1, args.workers),
+                                          cache_dir=cache_dir, work_dir=output_dir)
+
+    # 3. 按说话人增益补偿
+    if args.loudness_report:
+        print("\n   📐 按说话人增益补偿...")
+        with open(args.loudness_report) as f:
+            loudness_report = json.load(f)
+        envelope, _ = speaker_gain_envelope(loudness_report, speaker_segments, music_ranges, sr, total_samples)
+        if envelope is not None:
+            apply_gain_envelope(audio_data, *envelope)
+
+    # 4. 全局响度标准化 + true-peak limiter
+    print(f"\n   🌐 全局响度标准化 → {args.target_lufs} LUFS...")
+    audio_data, final_lufs, true_peak = normalize_in_memory(audio_data, sr, args.target_lufs)
+
+    # 5. 备份 + 编码（整条链只编码这一次）
+    if os.path.exists(args.output) and args.output != args.audio:
+        backup_path = args.output.replace('.mp3', '_pre_audio_fix.mp3')
+        if not os.path.exists(backup_path):
+            shutil.copy2(args.output, backup_path)
+            print(f"   📁 原文件已备份 → {backup_path}")
+
+    print(f"   编码输出 ({args.bitrate})...")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    encode_output(audio_data, sr, args.output, args.bitrate)
+
+    # 6. 验证：直接用编码前缓冲区上的测量结果
+    if final_lufs is not None:
+        print(f"\n   最终 LUFS: {final_lufs:.1f} (目标: {args.target_lufs})")
+    print(f"   最终 true peak: {20 * np.log10(max(true_peak, 1e-10)):.1f} dBTP")
+
+    print(f"\n✅ 音质处理完成 → {args.output}")
+
+
+if __name__ == '__main__':
+    main()
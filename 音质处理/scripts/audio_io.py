@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+音质处理脚本共用的音频读写：ffmpeg 管道解码 / 编码，不写临时文件。
+
+- decode_audio: 整段解码为 float32 单声道
+- stream_decode: 逐块解码（流式处理用）
+- StreamEncoder / encode_output: float32 分块写入 ffmpeg stdin 编码为 MP3
+"""
+
+import subprocess
+
+import numpy as np
+
+
+def probe_duration(audio_path):
+    """ffprobe 读取时长（秒），失败返回 None。"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1', audio_path
+        ], capture_output=True, text=True)
+        return float(result.stdout.strip())
+    except (OSError, ValueError):
+        return None
+
+
+def decode_audio(audio_path, target_sr=48000):
+    """
+    解码音频为 float32 单声道 numpy array + sample rate。
+
+    ffmpeg 直接输出 f32le 到 stdout，按 ffprobe 时长预分配数组后 readinto 填充
+    （时长不准时自动扩容），不写临时 WAV。
+    """
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', audio_path, '-vn',
+        '-f', 'f32le', '-acodec', 'pcm_f32le', '-ar', str(target_sr), '-ac', '1', 'pipe:1'
+    ]
+    duration = probe_duration(audio_path)
+    audio = np.empty(int((duration or 600.0) * target_sr) + target_sr, dtype=np.float32)
+    filled = 0  # 已写入字节数
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            if filled == audio.nbytes:
+                grown = np.empty(len(audio) * 2, dtype=np.float32)
+                grown[:len(audio)] = audio
+                audio = grown
+            n = proc.stdout.readinto(memoryview(audio.view(np.uint8))[filled:])
+            if not n:
+                break
+            filled += n
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+    return audio[:filled // 4], target_sr
+
+
+def stream_decode(audio_path, target_sr=48000, block_seconds=5.0):
+    """逐块解码为 float32 单声道，每次 yield 一个新数组（最后一块可能更短）。"""
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', audio_path, '-vn',
+        '-f', 'f32le', '-acodec', 'pcm_f32le', '-ar', str(target_sr), '-ac', '1', 'pipe:1'
+    ]
+    block_bytes = max(1, int(block_seconds * target_sr)) * 4
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            buf = np.empty(block_bytes // 4, dtype=np.float32)
+            view = memoryview(buf.view(np.uint8))
+            filled = 0
+            while filled < block_bytes:
+                n = proc.stdout.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+            if filled >= 4:
+                yield buf[:filled // 4]
+            if filled < block_bytes:
+                break
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+
+
+class StreamEncoder:
+    """MP3 流式编码器：write() 逐块把 float32 写进 ffmpeg stdin，close() 等待编码结束。"""
+
+    def __init__(self, sr, output_path, bitrate='192k', channels=1):
+        self.cmd = [
+            'ffmpeg', '-v', 'error', '-f', 'f32le', '-ar', str(sr), '-ac', str(channels), '-i', 'pipe:0',
+            '-c:a', 'libmp3lame', '-b:a', bitrate, '-y', output_path
+        ]
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.broken = False
+
+    def write(self, block):
+        if self.broken:
+            return
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+        except BrokenPipeError:
+            self.broken = True  # ffmpeg 提前退出，错误信息在 close() 时抛出
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = self.proc.stderr.read()
+        self.proc.stderr.close()
+        if self.proc.wait() != 0:
+            raise subprocess.CalledProcessError(self.proc.returncode, self.cmd, stderr=stderr)
+
+
+def encode_output(wav_data, sr, output_path, bitrate='192k', block_seconds=10.0):
+    """编码为 MP3：float32 分块写入 ffmpeg stdin，不写临时 WAV。"""
+    channels = 1 if wav_data.ndim == 1 else wav_data.shape[1]
+    encoder = StreamEncoder(sr, output_path, bitrate, channels)
+    block = max(1, int(block_seconds * sr))
+    try:
+        for pos in range(0, len(wav_data), block):
+            encoder.write(wav_data[pos:pos + block])
+    finally:
+        encoder.close()
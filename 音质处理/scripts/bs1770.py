@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+ITU-R BS.1770-4 响度计算的公共部分，供 analyze_loudness.py 和 normalize_loudness.py 共用。
+
+K 加权滤波器用 pyloudnorm 的公开 IIRfilter 按标准参数构建（与 pyln.Meter 默认的
+'K-weighting' 相同），带状态分块滤波；门限块能量由 100ms 帧能量滑动求和得到。
+"""
+
+import numpy as np
+
+BLOCK_S = 0.4        # BS.1770 门限块长度
+BLOCK_HOP_S = 0.1    # 块步长（75% 重叠）
+ABS_GATE_LUFS = -70.0
+REL_GATE_LU = -10.0
+
+
+def k_weighting_filters(sr):
+    """K 加权两级滤波器（high_shelf → high_pass），未安装 pyloudnorm 时抛 ImportError"""
+    from pyloudnorm.iirfilter import IIRfilter
+
+    return [
+        IIRfilter(4.0, 1 / np.sqrt(2), 1500.0, sr, 'high_shelf'),
+        IIRfilter(0.0, 0.5, 38.0, sr, 'high_pass'),
+    ]
+
+
+def filter_states(filters):
+    """每级滤波器的初始状态（全零）"""
+    return [np.zeros(max(len(f.a), len(f.b)) - 1) for f in filters]
+
+
+def k_weight(y, filters, states):
+    """对一块单声道采样做带状态 K 加权，states 原地更新，返回 float64 结果"""
+    from scipy.signal import lfilter
+
+    y = y.astype(np.float64)
+    for i, f in enumerate(filters):
+        y, states[i] = lfilter(f.b, f.a, y, zi=states[i])
+        y *= f.passband_gain
+    return y
+
+
+def window_mean_square(hop_energy, hop_len, hops_per_window):
+    """步长 1 帧的滑动窗口均方能量（400ms 门限块 = 4 帧）"""
+    if len(hop_energy) < hops_per_window:
+        return np.zeros(0)
+    c = np.concatenate(([0.0], np.cumsum(hop_energy)))
+    return (c[hops_per_window:] - c[:-hops_per_window]) / (hops_per_window * hop_len)
+
+
+def gated_lufs(block_z):
+    """BS.1770-4 门限积分响度：绝对门限 -70 LUFS，相对门限 -10 LU。块不够时返回 None"""
+    if len(block_z) == 0:
+        return None
+    with np.errstate(divide='ignore'):
+        block_l = -0.691 + 10 * np.log10(block_z)
+    gated = block_l >= ABS_GATE_LUFS
+    if not gated.any():
+        return None
+    rel_gate = -0.691 + 10 * np.log10(block_z[gated].mean()) + REL_GATE_LU
+    gated &= block_l > rel_gate
+    if not gated.any():
+        return None
+    return float(-0.691 + 10 * np.log10(block_z[gated].mean()))
+
+
+def ranges_block_mask(n_blocks, ranges, block_s=BLOCK_S, hop_s=BLOCK_HOP_S):
+    """块中心落在任一时间段内的门限块为 True（时间段先排序合并）"""
+    mask = np.zeros(n_blocks, dtype=bool)
+    if not ranges or n_blocks == 0:
+        return mask
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    starts = np.array([r[0] for r in merged])
+    ends = np.array([r[1] for r in merged])
+    centers = np.arange(n_blocks) * hop_s + block_s / 2
+    idx = np.searchsorted(starts, centers, side='right') - 1
+    valid = idx >= 0
+    mask[valid] = centers[valid] < ends[idx[valid]]
+    return mask
@@ -32,6 +32,115 @@ STEP_SECONDS = 1.0     # 滑动步长（秒）
 MUSIC_THRESHOLD = 0.55  # 音乐概率阈值
 MIN_MUSIC_DURATION = 3.0  # 最短音乐段（秒）
 MERGE_GAP = 2.0         # 合并间隔（秒）
+HPSS_KERNEL = 31        # HPSS 中值滤波核（帧），与 librosa 默认一致
+CHUNK_SECONDS = 60.0    # 分块计算帧级特征的块长（秒），内存只和块长成正比
+ONSET_TOP_DB = 80.0     # onset 用的 mel 谱 dB 动态范围（librosa power_to_db 默认）
+
+
+def window_stats(x, window_frames, starts, with_std=False):
+    """用累加和求每个窗口 x[start:start+window_frames] 的均值（和总体标准差）"""
+    import numpy as np
+
+    x = np.asarray(x, dtype=np.float64)
+    c1 = np.concatenate(([0.0], np.cumsum(x)))
+    mean = (c1[starts + window_frames] - c1[starts]) / window_frames
+    if not with_std:
+        return mean
+    c2 = np.concatenate(([0.0], np.cumsum(x * x)))
+    var = (c2[starts + window_frames] - c2[starts]) / window_frames - mean ** 2
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def padded_frames(y, start_frame, end_frame):
+    """
+    取出帧 [start_frame, end_frame) 需要的采样（帧 t 以 t × HOP_LENGTH 为中心），越界部分补零。
+
+    等价于 center=True、pad_mode='constant' 的全片分帧，按 center=False 处理这段采样
+    得到的帧与全片计算逐帧一致。
+    """
+    import numpy as np
+
+    lo = start_frame * HOP_LENGTH - FRAME_LENGTH // 2
+    hi = (end_frame - 1) * HOP_LENGTH + FRAME_LENGTH // 2
+    seg = np.zeros(hi - lo, dtype=np.float32)
+    src_lo, src_hi = max(lo, 0), min(hi, len(y))
+    if src_hi > src_lo:
+        seg[src_lo - lo:src_hi - lo] = y[src_lo:src_hi]
+    return seg
+
+
+def chunk_bounds(n_frames, chunk_frames, margin):
+    """yield (带边距的起止帧, 本块负责的起止帧)"""
+    for start in range(0, n_frames, chunk_frames):
+        end = min(start + chunk_frames, n_frames)
+        yield max(0, start - margin), min(n_frames, end + margin), start, end
+
+
+def frame_features(y, sr, chunk_seconds=CHUNK_SECONDS):
+    """
+    帧级特征，每块共用一次 STFT，按时间分块计算。
+
+    flatness、bandwidth 直接用幅度谱；onset 用幅度谱平方算 mel 谱；
+    harmonic ratio 与 librosa.effects.hpss 相同：复数谱 HPSS 后 istft 回时域，
+    取谐波信号与原信号的时域逐帧 RMS 之比；静音判断用的 RMS 同样在时域计算。
+
+    块之间留出 HPSS 中值核半宽 + istft 重叠帧数的边距，只保留每块中间的帧，结果与整段计算逐帧一致；
+    onset 的 dB 下限取决于全片 mel 谱最大值，所以各块先保存不设下限的 mel dB（每帧 128 个
+    float32，约为音频本身的四分之一），全部算完后统一加下限再做差分，整段只做一遍 STFT。
+    除 mel dB 外，峰值内存只和 chunk_seconds 成正比。
+    """
+    import librosa
+    import numpy as np
+
+    n_frames = 1 + len(y) // HOP_LENGTH
+    chunk_frames = max(1, int(chunk_seconds * sr / HOP_LENGTH))
+    # HPSS 中值核半宽 + 谐波信号的一帧 RMS 依赖前后各 FRAME_LENGTH // (2 × hop) 帧，istft 每个采样又各依赖这么多帧
+    margin = HPSS_KERNEL // 2 + 2 * (FRAME_LENGTH // (2 * HOP_LENGTH))
+
+    features = {name: np.zeros(n_frames, dtype=np.float32)
+                for name in ('flatness', 'harmonic_ratio', 'onset', 'bandwidth', 'energy')}
+    mel_db = None  # 全片 mel dB（不设下限），第一块算出 mel 频带数后分配
+    for lo, hi, start, end in chunk_bounds(n_frames, chunk_frames, margin):
+        D = librosa.stft(padded_frames(y, lo, hi), n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False)
+        S = np.abs(D)
+        keep = slice(start - lo, end - lo)
+
+        features['flatness'][start:end] = librosa.feature.spectral_flatness(S=S[:, keep])[0]
+        features['bandwidth'][start:end] = librosa.feature.spectral_bandwidth(S=S[:, keep], sr=sr)[0]
+
+        chunk_db = librosa.power_to_db(librosa.feature.melspectrogram(S=S ** 2, sr=sr), top_db=None)[:, keep]
+        if mel_db is None:
+            mel_db = np.empty((chunk_db.shape[0], n_frames), dtype=np.float32)
+        mel_db[:, start:end] = chunk_db
+
+        features['energy'][start:end] = librosa.feature.rms(
+            y=padded_frames(y, start, end), frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False)[0]
+
+        # harmonic/percussive 分离（中值核和 istft 重叠都在边距内，块内中间帧不受切块影响）
+        D_harmonic, _ = librosa.decompose.hpss(D, kernel_size=HPSS_KERNEL)
+        y_harmonic = librosa.istft(D_harmonic, hop_length=HOP_LENGTH, n_fft=FRAME_LENGTH, center=False, dtype=y.dtype)
+        # y_harmonic[k] 对应原信号第 offset + k 个采样；原信号范围外与 rms(center=True) 一样按 0 处理
+        offset = lo * HOP_LENGTH - FRAME_LENGTH // 2
+        y_harmonic[:max(0, -offset)] = 0
+        y_harmonic[max(0, len(y) - offset):] = 0
+        harmonic_energy = librosa.feature.rms(
+            y=y_harmonic[(start - lo) * HOP_LENGTH:(end - lo - 1) * HOP_LENGTH + FRAME_LENGTH],
+            frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False)[0]
+        total_energy = features['energy'][start:end]
+        features['harmonic_ratio'][start:end] = np.where(
+            total_energy > 1e-6, harmonic_energy / np.maximum(total_energy, 1e-6), 0)
+
+    # onset：全片 mel dB 最大值 - ONSET_TOP_DB 作下限，逐块求相邻帧的正增量均值
+    db_floor = np.float64(mel_db.max()) - ONSET_TOP_DB
+    onset_diff = np.zeros(n_frames, dtype=np.float32)  # onset_diff[t] = 帧 t+1 相对帧 t 的 mel dB 正增量均值
+    for _, _, start, end in chunk_bounds(n_frames - 1, chunk_frames, 0):
+        block = np.maximum(mel_db[:, start:end + 1], db_floor)
+        onset_diff[start:end] = np.maximum(0.0, block[:, 1:] - block[:, :-1]).mean(axis=0)
+
+    # 与 librosa.onset.onset_strength(center=True) 对齐：前面补 1 帧差分 + n_fft // (2 × hop) 帧
+    pad = 1 + FRAME_LENGTH // (2 * HOP_LENGTH)
+    features['onset'][pad:] = onset_diff[:n_frames - pad]
+    return features
 
 
 def analyze_music_probability(audio_path):
@@ -46,89 +155,47 @@ def analyze_music_probability(audio_path):
 
     # 计算帧级特征
     print("   计算频谱特征...")
-    spectral_flatness = librosa.feature.spectral_flatness(
-        y=y, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH
-    )[0]
-
-    # harmonic/percussive 分离
-    y_harmonic, y_percussive = librosa.effects.hpss(y)
-    harmonic_energy = librosa.feature.rms(y=y_harmonic, hop_length=HOP_LENGTH)[0]
-    total_energy = librosa.feature.rms(y=y, hop_length=HOP_LENGTH)[0]
-    harmonic_ratio = np.where(total_energy > 1e-6, harmonic_energy / total_energy, 0)
-
-    # onset 密度（音乐通常有更规律的 onset）
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=HOP_LENGTH)
-
-    # spectral bandwidth（音乐通常比人声宽）
-    spectral_bw = librosa.feature.spectral_bandwidth(
-        y=y, sr=sr, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH
-    )[0]
-
-    # 帧时间
-    frame_times = librosa.frames_to_time(
-        range(len(spectral_flatness)), sr=sr, hop_length=HOP_LENGTH
-    )
-
-    # 滑动窗口分析
+    features = frame_features(y, sr)
+    n_frames = min(len(f) for f in features.values())
+
+    # 滑动窗口分析（累加和一次算出所有窗口的均值/标准差）
     print("   滑动窗口分析...")
     window_frames = int(WINDOW_SECONDS * sr / HOP_LENGTH)
     step_frames = int(STEP_SECONDS * sr / HOP_LENGTH)
-
+    starts = np.arange(0, max(n_frames - window_frames, 0), step_frames)
+
+    win_flatness = window_stats(features['flatness'][:n_frames], window_frames, starts)
+    win_harmonic = window_stats(features['harmonic_ratio'][:n_frames], window_frames, starts)
+    _, win_onset = window_stats(features['onset'][:n_frames], window_frames, starts, with_std=True)  # onset 规律性
+    win_bw = window_stats(features['bandwidth'][:n_frames], window_frames, starts)
+    win_energy = window_stats(features['energy'][:n_frames], window_frames, starts)
+
+    # 综合评分
+    # 音乐特征：较低的 spectral flatness（更有调性）、较高的 harmonic ratio、
+    # 较宽的 bandwidth、较规律的 onset
+    # spectral flatness: 音乐通常 < 0.1，人声通常 > 0.1
+    score = np.select([win_flatness < 0.05, win_flatness < 0.1], [0.3, 0.15], 0.0)
+    # harmonic ratio: 音乐通常 > 0.7
+    score += np.select([win_harmonic > 0.8, win_harmonic > 0.6], [0.3, 0.15], 0.0)
+    # bandwidth: 音乐通常更宽
+    score += np.select([win_bw > 2000, win_bw > 1500], [0.2, 0.1], 0.0)
+    # onset regularity: 音乐通常更规律（低 std）
+    score += np.where(win_onset < np.percentile(features['onset'], 30), 0.2, 0.0)
+    # 静音段不算音乐
+    score[win_energy < 0.001] = 0.0
+
+    frame_times = librosa.frames_to_time(np.arange(n_frames), sr=sr, hop_length=HOP_LENGTH)
     results = []
-    n_frames = len(spectral_flatness)
-
-    for start_frame in range(0, n_frames - window_frames, step_frames):
-        end_frame = start_frame + window_frames
-        t_start = frame_times[start_frame]
-        t_end = frame_times[min(end_frame, n_frames - 1)]
-
-        # 窗口内特征统计
-        win_flatness = np.mean(spectral_flatness[start_frame:end_frame])
-        win_harmonic = np.mean(harmonic_ratio[start_frame:end_frame])
-        win_onset = np.std(onset_env[start_frame:end_frame])  # onset 规律性
-        win_bw = np.mean(spectral_bw[start_frame:end_frame])
-        win_energy = np.mean(total_energy[start_frame:end_frame])
-
-        # 综合评分
-        # 音乐特征：较低的 spectral flatness（更有调性）、较高的 harmonic ratio、
-        # 较宽的 bandwidth、较规律的 onset
-        score = 0.0
-
-        # spectral flatness: 音乐通常 < 0.1，人声通常 > 0.1
-        if win_flatness < 0.05:
-            score += 0.3
-        elif win_flatness < 0.1:
-            score += 0.15
-
-        # harmonic ratio: 音乐通常 > 0.7
-        if win_harmonic > 0.8:
-            score += 0.3
-        elif win_harmonic > 0.6:
-            score += 0.15
-
-        # bandwidth: 音乐通常更宽
-        if win_bw > 2000:
-            score += 0.2
-        elif win_bw > 1500:
-            score += 0.1
-
-        # onset regularity: 音乐通常更规律（低 std）
-        if win_onset < np.percentile(onset_env, 30):
-            score += 0.2
-
-        # 静音段不算音乐
-        if win_energy < 0.001:
-            score = 0.0
-
+    for k, start_frame in enumerate(starts):
         results.append({
-            'start': round(t_start, 2),
-            'end': round(t_end, 2),
-            'music_probability': round(score, 3),
+            'start': round(float(frame_times[start_frame]), 2),
+            'end': round(float(frame_times[min(start_frame + window_frames, n_frames - 1)]), 2),
+            'music_probability': round(float(score[k]), 3),
             'features': {
-                'spectral_flatness': round(float(win_flatness), 4),
-                'harmonic_ratio': round(float(win_harmonic), 4),
-                'bandwidth': round(float(win_bw), 1),
-                'energy': round(float(win_energy), 6)
+                'spectral_flatness': round(float(win_flatness[k]), 4),
+                'harmonic_ratio': round(float(win_harmonic[k]), 4),
+                'bandwidth': round(float(win_bw[k]), 1),
+                'energy': round(float(win_energy[k]), 6)
             }
         })
 
@@ -21,6 +21,15 @@
     --output audio_final.mp3 \
     --global-only
 
+  # 长音频：两遍流式处理，内存占用与时长无关
+  python3 normalize_loudness.py \
+    --audio audio_denoised.mp3 \
+    --loudness-report loudness_report.json \
+    --words subtitles_words.json \
+    --speaker-mapping speaker_mapping.json \
+    --output audio_final.mp3 \
+    --streaming
+
   # 指定音乐段保护
   python3 normalize_loudness.py \
     --audio audio_denoised.mp3 \
@@ -29,19 +38,25 @@
     --speaker-mapping speaker_mapping.json \
     --music-segments music_segments.json \
     --output audio_final.mp3
+
+  # limiter 自检（峰值前压缩、峰值处不超过 ceiling）
+  python3 normalize_loudness.py --self-check
 """
 
 import argparse
 import json
 import sys
-import subprocess
-import tempfile
 import shutil
 import os
 from collections import defaultdict
 
 import numpy as np
-import soundfile as sf
+
+from audio_io import probe_duration, decode_audio, stream_decode, StreamEncoder, encode_output
+from bs1770 import (
+    BLOCK_S, BLOCK_HOP_S, k_weighting_filters, filter_states, k_weight,
+    window_mean_square, gated_lufs, ranges_block_mask,
+)
 
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -49,6 +64,12 @@ sys.stderr.reconfigure(line_buffering=True)
 MAX_GAIN_DB = 8.0      # 最大增益限制
 CROSSFADE_MS = 30       # 说话人段落衔接 crossfade
 TRUE_PEAK_LIMIT = -1.0  # dBTP limiter 上限
+LIMITER_LOOKAHEAD_MS = 5.0   # limiter 预读（attack）时长
+LIMITER_RELEASE_MS = 80.0    # limiter 释放时长
+LIMITER_OVERSAMPLE = 4       # true peak 检测过采样倍数
+LUFS_TOLERANCE = 0.1         # limiter 后响度与目标的允许偏差（LU）
+MAX_NORMALIZE_PASSES = 3     # 增益 + limiter 最多迭代轮数
+STREAM_BLOCK_S = 5.0    # --streaming 每块时长
 
 
 def load_speaker_segments(words_path, mapping_path):
@@ -85,72 +106,249 @@ def load_speaker_segments(words_path, mapping_path):
     return dict(speaker_segments)
 
 
-def decode_audio(audio_path, target_sr=48000):
-    """解码音频为 WAV numpy array。"""
-    tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    tmp.close()
-    try:
-        subprocess.run([
-            'ffmpeg', '-i', audio_path, '-vn', '-acodec', 'pcm_s16le',
-            '-ar', str(target_sr), '-ac', '1', '-y', tmp.name
-        ], capture_output=True, check=True)
-        data, sr = sf.read(tmp.name)
-        return data, sr
-    finally:
-        os.unlink(tmp.name)
-
-
 def db_to_linear(db):
     return 10.0 ** (db / 20.0)
 
 
-def apply_gain_with_crossfade(audio, start_idx, end_idx, gain_linear, fade_samples):
-    """对指定范围应用增益，边界做 crossfade 过渡。"""
-    segment = audio[start_idx:end_idx].copy()
-    segment *= gain_linear
-
-    # 前 crossfade（从原始增益渐变到新增益）
-    if fade_samples > 0 and start_idx > 0:
-        fade_len = min(fade_samples, len(segment))
-        fade_curve = np.linspace(0.0, 1.0, fade_len)
-        original = audio[start_idx:start_idx + fade_len]
-        gained = segment[:fade_len]
-        segment[:fade_len] = original * (1.0 - fade_curve) + gained * fade_curve
-
-    # 后 crossfade（从新增益渐变回原始增益）
-    if fade_samples > 0 and end_idx < len(audio):
-        fade_len = min(fade_samples, len(segment))
-        fade_curve = np.linspace(1.0, 0.0, fade_len)
-        offset = len(segment) - fade_len
-        original = audio[end_idx - fade_len:end_idx]
-        gained = segment[offset:]
-        segment[offset:] = gained * fade_curve + original * (1.0 - fade_curve)
-
-    audio[start_idx:end_idx] = segment
-    return audio
-
-
-def apply_limiter(audio, peak_db):
-    """简单的 hard limiter，防止削波。"""
-    peak_linear = db_to_linear(peak_db)
-    peak_val = np.max(np.abs(audio))
-    if peak_val > peak_linear:
-        audio = audio * (peak_linear / peak_val)
+def merge_ranges(ranges):
+    """排序并合并重叠区间，返回 (starts, ends) 两个升序数组。"""
+    if not ranges:
+        return np.empty(0), np.empty(0)
+    r = np.array(sorted(ranges), dtype=np.float64)
+    run_end = np.maximum.accumulate(r[:, 1])
+    first = np.r_[True, r[1:, 0] > run_end[:-1]]
+    last = np.r_[first[1:], True]
+    return r[first, 0], run_end[last]
+
+
+def overlaps_ranges(starts, ends, range_starts, range_ends):
+    """向量化判断每个 [start, end) 是否与已合并的区间相交。"""
+    hit = np.zeros(len(starts), dtype=bool)
+    if len(range_starts) == 0:
+        return hit
+    i = np.searchsorted(range_ends, starts, side='right')  # 第一个 end > start 的区间
+    valid = i < len(range_starts)
+    hit[valid] = range_starts[i[valid]] < ends[valid]
+    return hit
+
+
+def gain_envelope_breakpoints(s_idx, e_idx, gains, total_samples, fade_samples):
+    """
+    把所有段落增益合成一条分段线性包络，返回 np.interp 用的 (xp, fp)。
+
+    每段是梯形：段首从 1 线性过渡到 gain，段尾过渡回 1（文件首尾不做 fade）。
+    梯形拐点处的斜率变化排序后 cumsum，一次得到所有断点上的包络值。
+    """
+    if len(s_idx) == 0:
+        return np.array([0.0]), np.array([1.0])
+    s = s_idx.astype(np.float64)
+    e = e_idx.astype(np.float64)
+    delta = np.asarray(gains, dtype=np.float64) - 1.0
+    fade = np.minimum(fade_samples, (e_idx - s_idx) // 2)
+
+    # fade 与原实现的 linspace 端点一致；不做 fade 时退化为 1 个采样宽的阶跃
+    ramp_in = (s_idx > 0) & (fade >= 2)
+    ramp_out = (e_idx < total_samples) & (fade >= 2)
+    in0 = np.where(ramp_in, s, s - 1)
+    in1 = np.where(ramp_in, s + fade - 1, s)
+    out0 = np.where(ramp_out, e - fade, e - 1)
+    out1 = np.where(ramp_out, e - 1, e)
+
+    k_in = delta / (in1 - in0)
+    k_out = delta / (out1 - out0)
+    xp = np.concatenate([in0, in1, out0, out1])
+    dk = np.concatenate([k_in, -k_in, -k_out, k_out])
+    order = np.argsort(xp, kind='stable')
+    xp, dk = xp[order], dk[order]
+
+    slope = np.cumsum(dk)
+    fp = np.empty_like(xp)
+    fp[0] = 0.0
+    fp[1:] = np.cumsum(slope[:-1] * np.diff(xp))
+    fp += 1.0
+    fp[np.abs(fp - 1.0) < 1e-9] = 1.0
+    # 段落重叠时梯形相加，限制在实际增益范围内
+    np.clip(fp, min(1.0, float(np.min(gains))), max(1.0, float(np.max(gains))), out=fp)
+    return xp, fp
+
+
+def apply_gain_envelope(audio, xp, fp, offset=0, block_samples=1 << 20):
+    """
+    按包络原地乘增益；offset 为 audio[0] 在整条音频中的采样位置（流式处理用）。
+
+    分块求值：平直区间用 np.repeat 铺常数，只有 fade 斜坡上的采样点走 np.interp；
+    整块包络恒为 1 时直接跳过。
+    """
+    bounds = np.ceil(xp).astype(np.int64)  # 区间 i 覆盖 [bounds[i-1], bounds[i])
+    level = np.r_[1.0, fp].astype(np.float32)
+    ramp = np.r_[False, np.abs(np.diff(fp)) > 1e-9, False]
+    total = len(audio)
+    for pos in range(0, total, block_samples):
+        end = min(pos + block_samples, total)
+        lo, hi = np.searchsorted(bounds, [pos + offset, end + offset], side='right')
+        if lo == hi and level[lo] == 1.0 and not ramp[lo]:
+            continue
+        counts = np.diff(np.r_[pos + offset, bounds[lo:hi], end + offset])
+        env = np.repeat(level[lo:hi + 1], counts)
+        t = np.flatnonzero(np.repeat(ramp[lo:hi + 1], counts))
+        env[t] = np.interp(t + pos + offset, xp, fp)
+        audio[pos:end] *= env
     return audio
 
 
-def encode_output(wav_data, sr, output_path, bitrate='192k'):
-    """编码为 MP3。"""
-    tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    tmp.close()
-    try:
-        sf.write(tmp.name, wav_data, sr)
-        subprocess.run([
-            'ffmpeg', '-i', tmp.name, '-c:a', 'libmp3lame',
-            '-b:a', bitrate, '-y', output_path
-        ], capture_output=True, check=True)
-    finally:
-        os.unlink(tmp.name)
+class StreamingLoudnessMeter:
+    """
+    流式 BS.1770 响度计：逐块喂入采样，K 加权滤波带状态，按 100ms 帧累积能量。
+
+    只保存每帧能量（每小时 36000 个 float）。
+    未安装 pyloudnorm 时退化为未加权能量（与非流式模式的 RMS fallback 对应）。
+    """
+
+    def __init__(self, sr):
+        try:
+            self.filters = k_weighting_filters(sr)
+        except ImportError:
+            self.filters = []
+        self.states = filter_states(self.filters)
+        self.hop = int(round(sr * BLOCK_HOP_S))
+        self.hops_per_block = int(round(BLOCK_S / BLOCK_HOP_S))
+        self.pending = np.zeros(0)
+        self.hop_energy = []
+
+    @property
+    def k_weighted(self):
+        return bool(self.filters)
+
+    def feed(self, block):
+        if len(block) == 0:
+            return
+        y = np.concatenate([self.pending, k_weight(block, self.filters, self.states)])
+        n = len(y) // self.hop * self.hop
+        self.hop_energy.append(np.square(y[:n]).reshape(-1, self.hop).sum(axis=1))
+        self.pending = y[n:]
+
+    def integrated(self, ranges=None):
+        """整体（或指定时间段内）的门限积分响度；ranges 按门限块中心筛选"""
+        energy = np.concatenate(self.hop_energy) if self.hop_energy else np.zeros(0)
+        block_z = window_mean_square(energy, self.hop, self.hops_per_block)
+        if ranges is not None:
+            block_z = block_z[ranges_block_mask(len(block_z), ranges)]
+        return gated_lufs(block_z)
+
+
+def hold_min(need, lookahead, release):
+    """增益需求的 [k-release, k+lookahead] 窗口最小值：每个峰值的压缩向前保持 lookahead、向后保持 release 个采样"""
+    from scipy.ndimage import minimum_filter1d
+
+    size = lookahead + release + 1
+    return minimum_filter1d(need, size, origin=release - size // 2, mode='nearest')
+
+
+class TruePeakLimiter:
+    """
+    可分块流式调用的 lookahead true-peak limiter。
+
+    每个采样的 true peak = 4× 过采样（resample_poly）后该采样到下一采样之间的最大幅度，
+    所需增益 g = min(1, ceiling / true_peak)。增益先做 [k-release, k+lookahead] 的最小值滤波，
+    再做 [n-lookahead, n+release] 的 boxcar 平均：平均窗口内每个最小值都覆盖 n，
+    因此平滑后的增益不会超过 n 处所需增益，且在峰值前 lookahead 开始线性压下、峰值后线性恢复。
+
+    process() 返回的输出比输入延迟 lookahead + release + 过采样边距个采样，flush() 输出剩余部分；
+    所有块的输出拼接后与输入等长、对齐。
+    """
+
+    def __init__(self, sr, ceiling_db=TRUE_PEAK_LIMIT, lookahead_ms=LIMITER_LOOKAHEAD_MS,
+                 release_ms=LIMITER_RELEASE_MS, oversample=LIMITER_OVERSAMPLE):
+        self.ceiling = db_to_linear(ceiling_db)
+        self.lookahead = max(1, int(sr * lookahead_ms / 1000.0))
+        self.release = max(1, int(sr * release_ms / 1000.0))
+        self.oversample = oversample
+        margin = 16  # resample_poly 默认 FIR 半长约 10 个输入采样
+        self.context = self.lookahead + self.release + margin
+        self.buf = np.zeros(self.context, dtype=np.float32)  # 开头补零作为历史
+        self.pending = self.context  # buf 中第一个尚未输出的采样
+        self.input_peak = 0.0  # 输入 true peak
+        self.output_peak = 0.0  # 输出 true peak（按平滑增益估算）
+        self.min_gain = 1.0
+
+    def true_peak(self, x):
+        """逐采样 true peak：max(|x[n]|, 过采样后 n 到 n+1 之间各点的幅度)"""
+        from scipy.signal import resample_poly
+
+        up = resample_poly(x.astype(np.float64), self.oversample, 1)
+        return np.abs(up[:len(x) * self.oversample]).reshape(-1, self.oversample).max(axis=1)
+
+    def _render(self, end):
+        lo = self.pending - self.context
+        seg = self.buf[lo:end + self.context]
+        tp = self.true_peak(seg)
+        need = np.minimum(1.0, self.ceiling / np.maximum(tp, 1e-12))
+
+        size = self.lookahead + self.release + 1
+        held = hold_min(need, self.lookahead, self.release)
+        c = np.concatenate(([0.0], np.cumsum(held)))
+        n = np.arange(self.pending - lo, end - lo)
+        gain = (c[n + self.release + 1] - c[n - self.lookahead]) / size
+
+        self.input_peak = max(self.input_peak, float(tp[n].max()))
+        self.output_peak = max(self.output_peak, float((tp[n] * gain).max()))
+        self.min_gain = min(self.min_gain, float(gain.min()))
+        return (self.buf[self.pending:end] * gain).astype(np.float32)
+
+    def process(self, block):
+        self.buf = np.concatenate([self.buf, np.asarray(block, dtype=np.float32)])
+        end = len(self.buf) - self.context
+        if end <= self.pending:
+            return np.zeros(0, dtype=np.float32)
+        out = self._render(end)
+        self.buf = self.buf[end - self.context:]
+        self.pending = self.context
+        return out
+
+    def flush(self):
+        return self.process(np.zeros(self.context, dtype=np.float32))
+
+
+def limited_pass(blocks, sr, gain, write):
+    """每块乘 gain → TruePeakLimiter → write()，同时流式测量 limiter 后的响度；返回 (LUFS, limiter)"""
+    limiter = TruePeakLimiter(sr)
+    meter = StreamingLoudnessMeter(sr)
+    for block in blocks:
+        out = limiter.process(block * gain)
+        meter.feed(out)
+        write(out)
+    out = limiter.flush()
+    meter.feed(out)
+    write(out)
+    return meter.integrated(), limiter
+
+
+def next_pass_gain(history, target_lufs):
+    """
+    limiter 压掉的响度补回增益；history 为已跑过的 [(gain, LUFS), ...]。
+
+    第一轮按 1:1 补偿，之后用最近两轮的实测斜率（割线法）估计，
+    已达标或到最大轮数时返回 None。
+    """
+    gain, lufs = history[-1]
+    if lufs is None or target_lufs is None or abs(target_lufs - lufs) <= LUFS_TOLERANCE:
+        return None
+    if len(history) >= MAX_NORMALIZE_PASSES:
+        print(f"   ⚠️ {MAX_NORMALIZE_PASSES} 轮后仍偏差 {target_lufs - lufs:+.2f} LU，停止迭代")
+        return None
+    slope = 1.0
+    if len(history) >= 2:
+        prev_gain, prev_lufs = history[-2]
+        step_db = 20 * np.log10(gain / prev_gain)
+        if abs(step_db) > 1e-6:
+            slope = float(np.clip((lufs - prev_lufs) / step_db, 0.1, 1.0))
+    return gain * db_to_linear((target_lufs - lufs) / slope)
+
+
+def print_limiter_stats(limiter, lufs):
+    lufs_text = f"{lufs:.2f} LUFS, " if lufs is not None else ""
+    print(f"   {lufs_text}true peak {20 * np.log10(max(limiter.output_peak, 1e-10)):.1f} dBTP, "
+          f"最大压缩 {20 * np.log10(max(limiter.min_gain, 1e-10)):.1f} dB")
 
 
 def format_time(seconds):
@@ -159,6 +357,211 @@ def format_time(seconds):
     return f"{m}:{s:02d}"
 
 
+def load_music_ranges(music_segments_path):
+    """读取 music_segments.json，返回 [(start, end), ...]；文件不存在时为空"""
+    if not music_segments_path or not os.path.exists(music_segments_path):
+        return []
+    with open(music_segments_path) as f:
+        music_data = json.load(f)
+    return [(s['start'], s['end']) for s in music_data.get('music_segments', [])]
+
+
+def speaker_gain_envelope(loudness_report, speaker_segments, music_ranges, sr, total_samples):
+    """
+    按响度报告的 boost_db 生成说话人增益包络（音乐段内的段落跳过）。
+    返回 (envelope 或 None, {说话人: 实际补偿的时间段})
+    """
+    fade_samples = int(CROSSFADE_MS / 1000.0 * sr)
+    music_starts, music_ends = merge_ranges(music_ranges)
+
+    speakers_info = loudness_report.get('speakers', {})
+    seg_s, seg_e, seg_gain = [], [], []
+    compensated = {}
+
+    for speaker, info in speakers_info.items():
+        boost_db = info.get('boost_db', 0)
+        if abs(boost_db) < 0.5:  # 不到 0.5dB 就不调了
+            print(f"   {speaker}: 偏差 {boost_db:+.1f} dB，无需调整")
+            continue
+
+        # 限制最大增益
+        if abs(boost_db) > MAX_GAIN_DB:
+            print(f"   ⚠️ {speaker}: 偏差 {boost_db:+.1f} dB 超过限制，裁剪到 {MAX_GAIN_DB:+.1f} dB")
+            boost_db = MAX_GAIN_DB if boost_db > 0 else -MAX_GAIN_DB
+
+        segments = np.array(speaker_segments.get(speaker, []), dtype=np.float64).reshape(-1, 2)
+        keep = ~overlaps_ranges(segments[:, 0], segments[:, 1], music_starts, music_ends)
+        s_idx = np.clip((segments[keep, 0] * sr).astype(np.int64), 0, total_samples)
+        e_idx = np.clip((segments[keep, 1] * sr).astype(np.int64), 0, total_samples)
+        valid = e_idx > s_idx
+        seg_s.append(s_idx[valid])
+        seg_e.append(e_idx[valid])
+        seg_gain.append(np.full(int(valid.sum()), db_to_linear(boost_db)))
+        compensated[speaker] = segments[keep][valid].tolist()
+
+        print(f"   {speaker}: {boost_db:+.1f} dB 应用到 {int(valid.sum())} 段")
+
+    adjusted_count = sum(len(x) for x in seg_s)
+    print(f"   共调整 {adjusted_count} 个段落")
+    if not adjusted_count:
+        return None, compensated
+    envelope = gain_envelope_breakpoints(
+        np.concatenate(seg_s), np.concatenate(seg_e), np.concatenate(seg_gain),
+        total_samples, fade_samples
+    )
+    return envelope, compensated
+
+
+def normalize_in_memory(audio_data, sr, target_lufs):
+    """
+    全局增益 + true-peak limiter（内存中），limiter 压低的响度迭代补回。
+    返回 (处理后的音频, limiter 后实测 LUFS 或 None, limiter 后 true peak)
+    """
+    gain = 1.0
+    target = None  # 能测出 LUFS 时，limiter 后按目标迭代补偿
+    try:
+        import pyloudnorm as pyln
+        meter = pyln.Meter(sr)
+        current_lufs = meter.integrated_loudness(audio_data)
+        print(f"   当前整体 LUFS: {current_lufs:.1f}")
+
+        if not np.isinf(current_lufs) and not np.isnan(current_lufs):
+            gain = db_to_linear(target_lufs - current_lufs)
+            target = target_lufs
+            print(f"   标准化增益: {target_lufs - current_lufs:+.1f} dB")
+        else:
+            print("   ⚠️ 无法测量 LUFS（可能音频太静），跳过全局标准化")
+    except ImportError:
+        print("   ⚠️ pyloudnorm 未安装，使用简单的 RMS 标准化")
+        # fallback: 基于 RMS 的简单标准化
+        rms = np.sqrt(np.mean(audio_data ** 2))
+        if rms > 1e-6:
+            # -16 LUFS ≈ -16.5 dBFS RMS（近似）
+            target_rms = db_to_linear(-16.5)
+            gain = target_rms / rms
+            print(f"   RMS 标准化增益: {20 * np.log10(gain):+.1f} dB")
+
+    # limiter 压低的响度在内存中迭代补回
+    print(f"   应用 lookahead true-peak limiter ({TRUE_PEAK_LIMIT} dBTP)...")
+    block = int(STREAM_BLOCK_S * sr)
+    limited = np.empty_like(audio_data)
+    history = []
+    while True:
+        written = [0]
+
+        def write(out):
+            limited[written[0]:written[0] + len(out)] = out
+            written[0] += len(out)
+
+        blocks = (audio_data[pos:pos + block] for pos in range(0, len(audio_data), block))
+        lufs, limiter = limited_pass(blocks, sr, gain, write)
+        print_limiter_stats(limiter, lufs)
+        history.append((gain, lufs))
+        gain = next_pass_gain(history, target)
+        if gain is None:
+            break
+    return limited, lufs, limiter.output_peak
+
+
+def backup_output(output_path, input_path):
+    if os.path.exists(output_path) and output_path != input_path:
+        backup_path = output_path.replace('.mp3', '_pre_normalize.mp3')
+        if not os.path.exists(backup_path):
+            shutil.copy2(output_path, backup_path)
+            print(f"   📁 原文件已备份 → {backup_path}")
+
+
+def enveloped_blocks(audio_path, sr, envelope=None):
+    """逐块解码并乘上说话人增益包络"""
+    pos = 0
+    for block in stream_decode(audio_path, sr, STREAM_BLOCK_S):
+        if envelope is not None:
+            apply_gain_envelope(block, *envelope, offset=pos)
+        pos += len(block)
+        yield block
+
+
+def measure_stream(audio_path, sr, envelope=None, ranges=None):
+    """流式测量（可选先乘增益包络），返回 (meter, 整体 LUFS, {名称: LUFS})"""
+    meter = StreamingLoudnessMeter(sr)
+    for block in enveloped_blocks(audio_path, sr, envelope):
+        meter.feed(block)
+    ranges = ranges or {}
+    return meter, meter.integrated(), {name: meter.integrated(r) for name, r in ranges.items()}
+
+
+def normalize_streaming(args, sr, envelope, compensated):
+    """
+    两遍流式标准化：第一遍解码 → 增益包络 → 测量响度；
+    第二遍解码 → 增益包络 × 全局增益 → true-peak limiter → 直接写入编码器，同时测量输出响度。
+    limiter 压低响度超过 LUFS_TOLERANCE 时补偿增益再编码一遍；最终 LUFS 用最后一遍的测量值。
+    每次只在内存中保留一个 STREAM_BLOCK_S 的块。
+    """
+    # 第一遍：测量
+    print(f"\n   🌐 第一遍：流式测量响度...")
+    meter, current_lufs, speaker_lufs = measure_stream(args.audio, sr, envelope, compensated)
+    for speaker, lufs in speaker_lufs.items():
+        if lufs is not None:
+            print(f"   {speaker}: 补偿后 {lufs:.1f} LUFS")
+    if not meter.k_weighted:
+        print("   ⚠️ pyloudnorm 未安装，按未加权能量近似 LUFS")
+
+    gain = 1.0
+    if current_lufs is None:
+        print("   ⚠️ 无法测量 LUFS（可能音频太静），跳过全局标准化")
+    else:
+        print(f"   当前整体 LUFS: {current_lufs:.1f}")
+        gain = db_to_linear(args.target_lufs - current_lufs)
+        print(f"   标准化增益: {args.target_lufs - current_lufs:+.1f} dB")
+
+    # 第二遍：处理 + 编码；先写同目录临时文件，完成后替换（支持 --output 与 --audio 相同）
+    backup_output(args.output, args.audio)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    root, ext = os.path.splitext(args.output)
+    partial_path = f"{root}.part{ext}"
+    target = args.target_lufs if current_lufs is not None else None
+    history = []
+    while True:
+        print(f"   第 {len(history) + 2} 遍：limiter ({TRUE_PEAK_LIMIT} dBTP) + 编码输出 ({args.bitrate})...")
+        encoder = StreamEncoder(sr, partial_path, args.bitrate)
+        try:
+            lufs, limiter = limited_pass(enveloped_blocks(args.audio, sr, envelope), sr, gain, encoder.write)
+        finally:
+            encoder.close()
+        print_limiter_stats(limiter, lufs)
+        history.append((gain, lufs))
+        gain = next_pass_gain(history, target)
+        if gain is None:
+            break
+    os.replace(partial_path, args.output)
+
+    # 最终 LUFS 取最后一遍写入编码器的采样的实测值，不再重新解码输出
+    final_lufs = history[-1][1]
+    if final_lufs is not None:
+        print(f"\n   最终 LUFS: {final_lufs:.1f} (目标: {args.target_lufs})")
+
+    print(f"\n✅ 响度标准化完成 → {args.output}")
+
+
+def self_check(sr=48000):
+    """
+    limiter 自检：单个过载峰值的增益必须在峰值之前就开始下降（hold_min 的 origin 方向正确），
+    且峰值处输出不超过 ceiling。返回是否通过。
+    """
+    limiter = TruePeakLimiter(sr)
+    n = 4 * limiter.context
+    peak = n // 2
+    x = np.full(n, 0.1, dtype=np.float32)
+    x[peak] = 2.0
+    y = np.concatenate([limiter.process(x), limiter.flush()])
+    reduced = np.flatnonzero(y < x * (1 - 1e-6))
+    lead = peak - reduced[0] if len(reduced) else 0
+    ok = lead >= limiter.lookahead and abs(y[peak]) <= limiter.ceiling * (1 + 1e-3)
+    print(f"{'✅' if ok else '❌'} limiter 自检: 增益在峰值前 {lead} 个采样开始下降"
+          f"（lookahead {limiter.lookahead}），峰值处 {abs(y[peak]):.3f} / ceiling {limiter.ceiling:.3f}")
+    return ok
+
+
 def main():
     parser = argparse.ArgumentParser(description='按说话人增益补偿 + 全局响度标准化')
     parser.add_argument('--audio', required=True, help='输入音频路径')
@@ -170,18 +573,27 @@ def main():
     parser.add_argument('--output', required=True, help='输出音频路径')
     parser.add_argument('--bitrate', default='192k', help='输出码率（默认 192k）')
     parser.add_argument('--global-only', action='store_true', help='跳过按说话人补偿，只做全局标准化')
+    parser.add_argument('--streaming', action='store_true',
+                        help='两遍流式处理（先测量再处理+编码），内存占用与音频时长无关')
     args = parser.parse_args()
 
     print(f"🔊 开始响度标准化")
     print(f"   输入: {args.audio}")
     print(f"   目标: {args.target_lufs} LUFS")
 
-    # 1. 解码音频
-    print("   解码音频...")
-    audio_data, sr = decode_audio(args.audio)
-    fade_samples = int(CROSSFADE_MS / 1000.0 * sr)
-    total_samples = len(audio_data)
-    print(f"   采样率: {sr}Hz, 时长: {format_time(total_samples / sr)}")
+    # 1. 解码音频（流式模式只探测时长，处理时再逐块解码）
+    if args.streaming:
+        sr = 48000
+        duration = probe_duration(args.audio)
+        total_samples = int(duration * sr) if duration else np.iinfo(np.int64).max
+        print(f"   流式处理，采样率: {sr}Hz, 时长: {format_time(duration) if duration else '未知'}")
+    else:
+        print("   解码音频...")
+        audio_data, sr = decode_audio(args.audio)
+        total_samples = len(audio_data)
+        print(f"   采样率: {sr}Hz, 时长: {format_time(total_samples / sr)}")
+    envelope = None
+    compensated = {}
 
     # 2. 按说话人增益补偿
     if not args.global_only and args.loudness_report and args.words and args.speaker_mapping:
@@ -191,106 +603,32 @@ def main():
             loudness_report = json.load(f)
 
         speaker_segments = load_speaker_segments(args.words, args.speaker_mapping)
-
-        # 加载音乐段（跳过）
-        music_ranges = []
-        if args.music_segments and os.path.exists(args.music_segments):
-            with open(args.music_segments) as f:
-                music_data = json.load(f)
-            music_ranges = [(s['start'], s['end']) for s in music_data.get('music_segments', [])]
-
-        def in_music_range(start, end):
-            for ms, me in music_ranges:
-                if start < me and end > ms:
-                    return True
-            return False
-
-        speakers_info = loudness_report.get('speakers', {})
-        adjusted_count = 0
-
-        for speaker, info in speakers_info.items():
-            boost_db = info.get('boost_db', 0)
-            if abs(boost_db) < 0.5:  # 不到 0.5dB 就不调了
-                print(f"   {speaker}: 偏差 {boost_db:+.1f} dB，无需调整")
-                continue
-
-            # 限制最大增益
-            if abs(boost_db) > MAX_GAIN_DB:
-                print(f"   ⚠️ {speaker}: 偏差 {boost_db:+.1f} dB 超过限制，裁剪到 {MAX_GAIN_DB:+.1f} dB")
-                boost_db = MAX_GAIN_DB if boost_db > 0 else -MAX_GAIN_DB
-
-            gain_linear = db_to_linear(boost_db)
-            segments = speaker_segments.get(speaker, [])
-            seg_count = 0
-
-            for seg_start, seg_end in segments:
-                if in_music_range(seg_start, seg_end):
-                    continue
-                s_idx = int(seg_start * sr)
-                e_idx = int(seg_end * sr)
-                s_idx = max(0, min(s_idx, total_samples))
-                e_idx = max(0, min(e_idx, total_samples))
-                if e_idx <= s_idx:
-                    continue
-
-                audio_data = apply_gain_with_crossfade(
-                    audio_data, s_idx, e_idx, gain_linear, fade_samples
-                )
-                seg_count += 1
-
-            print(f"   {speaker}: {boost_db:+.1f} dB 应用到 {seg_count} 段")
-            adjusted_count += seg_count
-
-        print(f"   共调整 {adjusted_count} 个段落")
+        music_ranges = load_music_ranges(args.music_segments)
+        envelope, compensated = speaker_gain_envelope(
+            loudness_report, speaker_segments, music_ranges, sr, total_samples
+        )
+        if envelope is not None and not args.streaming:
+            apply_gain_envelope(audio_data, *envelope)
     else:
         if not args.global_only:
             print("   ⚠️ 缺少 loudness-report/words/speaker-mapping，跳过按说话人补偿")
 
-    # 3. 全局响度标准化
-    print(f"\n   🌐 全局响度标准化 → {args.target_lufs} LUFS...")
-
-    try:
-        import pyloudnorm as pyln
-        meter = pyln.Meter(sr)
-        current_lufs = meter.integrated_loudness(audio_data)
-        print(f"   当前整体 LUFS: {current_lufs:.1f}")
-
-        if not np.isinf(current_lufs) and not np.isnan(current_lufs):
-            # 使用 pyloudnorm 标准化
-            audio_data = pyln.normalize.loudness(audio_data, current_lufs, args.target_lufs)
-            print(f"   标准化增益: {args.target_lufs - current_lufs:+.1f} dB")
-        else:
-            print("   ⚠️ 无法测量 LUFS（可能音频太静），跳过全局标准化")
-    except ImportError:
-        print("   ⚠️ pyloudnorm 未安装，使用简单的 RMS 标准化")
-        # fallback: 基于 RMS 的简单标准化
-        rms = np.sqrt(np.mean(audio_data ** 2))
-        if rms > 1e-6:
-            # -16 LUFS ≈ -16.5 dBFS RMS（近似）
-            target_rms = db_to_linear(-16.5)
-            gain = target_rms / rms
-            audio_data *= gain
-            print(f"   RMS 标准化增益: {20 * np.log10(gain):+.1f} dB")
-
-    # 4. Limiter
-    print(f"   应用 limiter (peak {TRUE_PEAK_LIMIT} dBTP)...")
-    audio_data = apply_limiter(audio_data, TRUE_PEAK_LIMIT)
+    if args.streaming:
+        normalize_streaming(args, sr, envelope, compensated)
+        return
 
-    peak_db = 20 * np.log10(max(np.max(np.abs(audio_data)), 1e-10))
-    print(f"   最终 peak: {peak_db:.1f} dBFS")
+    # 3. 全局响度标准化 + true-peak limiter
+    print(f"\n   🌐 全局响度标准化 → {args.target_lufs} LUFS...")
+    audio_data, _, _ = normalize_in_memory(audio_data, sr, args.target_lufs)
 
-    # 5. 备份 + 输出
-    if os.path.exists(args.output) and args.output != args.audio:
-        backup_path = args.output.replace('.mp3', '_pre_normalize.mp3')
-        if not os.path.exists(backup_path):
-            shutil.copy2(args.output, backup_path)
-            print(f"   📁 原文件已备份 → {backup_path}")
+    # 4. 备份 + 输出
+    backup_output(args.output, args.audio)
 
     print(f"   编码输出 ({args.bitrate})...")
     os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
     encode_output(audio_data, sr, args.output, args.bitrate)
 
-    # 6. 验证最终 LUFS
+    # 5. 验证最终 LUFS
     try:
         import pyloudnorm as pyln
         final_data, final_sr = decode_audio(args.output)
@@ -304,4 +642,6 @@ def main():
 
 
 if __name__ == '__main__':
+    if sys.argv[1:] == ['--self-check']:
+        sys.exit(0 if self_check() else 1)
     main()
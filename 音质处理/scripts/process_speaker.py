@@ -33,22 +33,38 @@
 """
 
 import argparse
+import hashlib
 import json
 import sys
 import subprocess
 import tempfile
 import shutil
 import os
+import time
 from collections import defaultdict
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
 
 import numpy as np
 import soundfile as sf
 
+from audio_io import decode_audio, encode_output
+
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
 
 CROSSFADE_MS = 50  # 衔接处 crossfade 毫秒数
 MERGE_GAP_S = 0.5  # 间隔小于此值的段落合并处理
+DF_BATCH_SECONDS = 300.0  # DeepFilterNet 每批打包的音频总时长上限（含补零）
+DF_CLI_FILES_PER_CALL = 16  # CLI 模式每次调用处理的批文件数
+DENOISE_CACHE_VERSION = 2
+DENOISE_CACHE_TTL_DAYS = 14  # 超过此天数没被用到的缓存条目在运行结束时清理
+DENOISE_CACHE_TMP_GRACE_S = 3600  # 临时文件超过此秒数才当作崩溃残留清理（可能有别的进程正在写）
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS')  # 多进程降噪时限制每个 worker 的线程数
+SNR_FRAME_MS = 20  # SNR 预筛的能量帧长
+SNR_NOISE_PERCENTILE = 10  # 段内帧能量的低分位数作为噪声底
+SNR_SPEECH_PERCENTILE = 90  # 段内帧能量的高分位数作为语音电平
 
 
 def load_speaker_segments(words_path, mapping_path):
@@ -85,117 +101,528 @@ def load_speaker_segments(words_path, mapping_path):
     return dict(speaker_segments)
 
 
-def decode_audio(audio_path, target_sr=48000):
-    """解码音频为 WAV numpy array。"""
-    tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    tmp.close()
-    try:
-        subprocess.run([
-            'ffmpeg', '-i', audio_path, '-vn', '-acodec', 'pcm_s16le',
-            '-ar', str(target_sr), '-ac', '1', '-y', tmp.name
-        ], capture_output=True, check=True)
-        data, sr = sf.read(tmp.name)
-        return data, sr
-    finally:
-        os.unlink(tmp.name)
-
-
-def run_deepfilter(audio_segment, sr, tmp_dir):
-    """对一段音频跑 DeepFilterNet，返回处理后的 numpy array。"""
-    in_path = os.path.join(tmp_dir, 'segment_in.wav')
-    out_dir = os.path.join(tmp_dir, 'df_out')
-    os.makedirs(out_dir, exist_ok=True)
-
-    sf.write(in_path, audio_segment, sr)
+def plan_df_batches(lengths, batch_samples):
+    """
+    按长度降序贪心装箱：每批 段数 × 最长段 ≤ batch_samples（单段超长时独占一批）。
+    batch_samples ≤ 0 时每段单独成批。
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batches, current = [], []
+    for i in order:
+        if current and (batch_samples <= 0 or (len(current) + 1) * lengths[current[0]] > batch_samples):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class DeepFilterRunner:
+    """
+    批量跑 DeepFilterNet。
+
+    DeepFilterNet 把多声道输入的每个声道当作 batch 里独立的一条处理，所以把多个段落
+    补零到同一长度、按声道打包成一批，一次前向就处理完（尾部补零不影响前面的采样）。
+    优先用 Python API（df.enhance），模型只加载一次常驻内存；没装 Python 包时退回
+    deepFilter CLI，每批写成一个多声道 WAV，一次调用传多个文件。CLI 只能读写文件，
+    批文件放在 work_dir（输出目录）下的临时子目录里，处理完立即删除，不写 /tmp。
+    输出按原段落长度截取，与输入逐采样对齐。
+    """
+
+    def __init__(self, sr, batch_seconds=DF_BATCH_SECONDS, work_dir='.'):
+        self.sr = sr
+        self.work_dir = work_dir
+        self.batch_samples = int(batch_seconds * sr)
+        self.model = None
+        try:
+            from df.enhance import init_df
+            model, df_state, _ = init_df(log_level='WARNING', log_file=None)
+            if df_state.sr() == sr:
+                self.model, self.df_state = model, df_state
+            else:
+                print(f"   ⚠️ DeepFilterNet 模型采样率 {df_state.sr()}Hz ≠ {sr}Hz，改用 CLI")
+        except ImportError:
+            pass
+        self.mode = 'api' if self.model is not None else 'cli'
+
+    @staticmethod
+    def pack(segments, batch):
+        packed = np.zeros((len(batch), max(len(segments[i]) for i in batch)), dtype=np.float32)
+        for row, i in enumerate(batch):
+            packed[row, :len(segments[i])] = segments[i]
+        return packed
+
+    def process(self, segments):
+        """逐批处理，yield (段落序号, 处理后音频, 是否成功)；批内失败时原样返回该批、标记为失败"""
+        batches = plan_df_batches([len(seg) for seg in segments], self.batch_samples)
+        if self.mode == 'api':
+            for batch in batches:
+                yield from self._process_api(segments, batch)
+        else:
+            for k in range(0, len(batches), DF_CLI_FILES_PER_CALL):
+                yield from self._process_cli(segments, batches[k:k + DF_CLI_FILES_PER_CALL])
 
-    result = subprocess.run(
-        ['deepFilter', in_path, '-o', out_dir],
-        capture_output=True, text=True
-    )
+    def _process_api(self, segments, batch):
+        import torch
+        from df.enhance import enhance
 
-    if result.returncode != 0:
-        print(f"   ⚠️ DeepFilterNet 错误: {result.stderr[:200]}")
-        return audio_segment  # 失败时返回原音频
-
-    # DeepFilterNet 输出文件名与输入同名
-    out_path = os.path.join(out_dir, 'segment_in.wav')
-    if not os.path.exists(out_path):
-        # 有些版本输出到 out_dir 下的子目录
-        for root, dirs, files in os.walk(out_dir):
-            for f in files:
-                if f.endswith('.wav'):
-                    out_path = os.path.join(root, f)
-                    break
-
-    if os.path.exists(out_path):
-        processed, _ = sf.read(out_path)
-        return processed
-    else:
-        print(f"   ⚠️ 找不到 DeepFilterNet 输出文件")
-        return audio_segment
+        try:
+            packed = self.pack(segments, batch)
+            enhanced = enhance(self.model, self.df_state, torch.from_numpy(packed)).numpy()
+        except Exception as e:
+            print(f"   ⚠️ DeepFilterNet 错误: {str(e)[:200]}")
+            for i in batch:
+                yield i, segments[i], False  # 失败时返回原音频
+            return
+        for row, i in enumerate(batch):
+            yield i, enhanced[row, :len(segments[i])], True
+
+    def _process_cli(self, segments, batches):
+        os.makedirs(self.work_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix='.df_work_', dir=self.work_dir)
+        out_dir = os.path.join(tmp_dir, 'df_out')
+        try:
+            in_paths = []
+            for k, batch in enumerate(batches):
+                in_path = os.path.join(tmp_dir, f'batch_{k:03d}.wav')
+                sf.write(in_path, self.pack(segments, batch).T, self.sr, subtype='FLOAT')
+                in_paths.append(in_path)
+
+            result = subprocess.run(
+                ['deepFilter', *in_paths, '-o', out_dir],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"   ⚠️ DeepFilterNet 错误: {result.stderr[:200]}")
+
+            # DeepFilterNet 输出文件名为 <输入名>[_<模型名>].wav，有些版本输出到子目录
+            outputs = {}
+            for root, dirs, files in os.walk(out_dir):
+                for f in files:
+                    if f.endswith('.wav'):
+                        outputs[f[:len('batch_000')]] = os.path.join(root, f)
+
+            for k, batch in enumerate(batches):
+                out_path = outputs.get(f'batch_{k:03d}')
+                if out_path is None:
+                    if result.returncode == 0:
+                        print(f"   ⚠️ 找不到 DeepFilterNet 输出文件")
+                    for i in batch:
+                        yield i, segments[i], False  # 失败时返回原音频
+                    continue
+                processed, _ = sf.read(out_path, dtype='float32', always_2d=True)
+                for row, i in enumerate(batch):
+                    out = processed[:len(segments[i]), row]
+                    if len(out) < len(segments[i]):
+                        out = np.concatenate([out, np.zeros(len(segments[i]) - len(out), dtype=np.float32)])
+                    yield i, out, True
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
-def apply_crossfade(original, processed, seg_start_idx, seg_end_idx, fade_samples):
-    """在处理段和原始段的衔接处做 crossfade。"""
-    result = original.copy()
+def apply_crossfade(result, processed, seg_start_idx, seg_end_idx, fade_samples):
+    """
+    把处理后的段落原地写回 result，衔接处与 result 里现有的内容做 crossfade。
 
+    只分配段落和 fade 窗口大小的临时数组，不复制整条音频。
+    """
     # 确保长度匹配（DeepFilterNet 可能微调长度）
     seg_len = seg_end_idx - seg_start_idx
     if len(processed) > seg_len:
         processed = processed[:seg_len]
     elif len(processed) < seg_len:
-        pad = np.zeros(seg_len - len(processed))
+        pad = np.zeros(seg_len - len(processed), dtype=processed.dtype)
         processed = np.concatenate([processed, pad])
 
-    # 写入处理后的段落
-    result[seg_start_idx:seg_end_idx] = processed
-
-    # 前衔接 crossfade（原始淡出 → 处理后淡入）
-    fade_in_start = max(0, seg_start_idx)
-    fade_in_end = min(seg_start_idx + fade_samples, seg_end_idx)
-    fade_len = fade_in_end - fade_in_start
-    if fade_len > 0:
-        fade_curve = np.linspace(0.0, 1.0, fade_len)
-        result[fade_in_start:fade_in_end] = (
-            original[fade_in_start:fade_in_end] * (1.0 - fade_curve) +
-            processed[:fade_len] * fade_curve
-        )
+    # 前衔接 crossfade（原始淡出 → 处理后淡入），先用写入前的内容算好
+    fade_in_len = min(fade_samples, seg_len)
+    fade_curve = np.linspace(0.0, 1.0, fade_in_len)
+    fade_in = (
+        result[seg_start_idx:seg_start_idx + fade_in_len] * (1.0 - fade_curve) +
+        processed[:fade_in_len] * fade_curve
+    )
 
     # 后衔接 crossfade（处理后淡出 → 原始淡入）
-    fade_out_start = max(seg_start_idx, seg_end_idx - fade_samples)
-    fade_out_end = seg_end_idx
-    fade_len = fade_out_end - fade_out_start
-    if fade_len > 0:
-        fade_curve = np.linspace(1.0, 0.0, fade_len)
-        offset = fade_out_start - seg_start_idx
-        result[fade_out_start:fade_out_end] = (
-            processed[offset:offset + fade_len] * fade_curve +
-            original[fade_out_start:fade_out_end] * (1.0 - fade_curve)
-        )
+    fade_out_len = min(fade_samples, seg_len)
+    fade_out_start = seg_end_idx - fade_out_len
+    fade_curve = np.linspace(1.0, 0.0, fade_out_len)
+    fade_out = (
+        processed[seg_len - fade_out_len:] * fade_curve +
+        result[fade_out_start:seg_end_idx] * (1.0 - fade_curve)
+    )
 
+    # 写入处理后的段落和两端过渡
+    result[seg_start_idx:seg_end_idx] = processed
+    result[seg_start_idx:seg_start_idx + fade_in_len] = fade_in
+    result[fade_out_start:seg_end_idx] = fade_out
     return result
 
 
-def encode_output(wav_data, sr, output_path, bitrate='192k'):
-    """编码为 MP3。"""
-    tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    tmp.close()
-    try:
-        sf.write(tmp.name, wav_data, sr)
-        subprocess.run([
-            'ffmpeg', '-i', tmp.name, '-c:a', 'libmp3lame',
-            '-b:a', bitrate, '-y', output_path
-        ], capture_output=True, check=True)
-    finally:
-        os.unlink(tmp.name)
-
-
 def format_time(seconds):
     m = int(seconds) // 60
     s = int(seconds) % 60
     return f"{m}:{s:02d}"
 
 
+def collect_target_segments(all_segments, target_speakers, music_ranges):
+    """收集目标说话人要处理的段落（跳过音乐段内和过短的段落），按开始时间排序"""
+    def in_music_range(start, end):
+        for ms, me in music_ranges:
+            if start < me and end > ms:
+                return True
+        return False
+
+    segments_to_process = []
+    for speaker in target_speakers:
+        if speaker not in all_segments:
+            print(f"   ⚠️ 说话人 '{speaker}' 未找到，跳过")
+            continue
+        for seg_start, seg_end in all_segments[speaker]:
+            if in_music_range(seg_start, seg_end):
+                continue
+            if seg_end - seg_start < 0.3:  # 太短的段落跳过
+                continue
+            segments_to_process.append((seg_start, seg_end, speaker))
+
+    segments_to_process.sort(key=lambda x: x[0])
+    return segments_to_process
+
+
+def segment_snr(audio_data, sr, bounds):
+    """
+    用帧能量估计每段的噪声底和 SNR（dB）。
+
+    段内停顿的低分位帧能量当作噪声底，高分位当作语音电平，两者之差就是 SNR。
+    太短、没有停顿的段落两个分位数接近，SNR 偏低，会被保守地送去降噪。
+    """
+    frame = max(1, int(SNR_FRAME_MS / 1000.0 * sr))
+    snrs = np.full(len(bounds), -np.inf)
+    for i, (s_idx, e_idx) in enumerate(bounds):
+        n_frames = (e_idx - s_idx) // frame
+        if n_frames < 2:
+            continue
+        frames = audio_data[s_idx:s_idx + n_frames * frame].reshape(n_frames, frame)
+        energy_db = 10 * np.log10(np.einsum('ij,ij->i', frames, frames) / frame + 1e-12)
+        noise_db, speech_db = np.percentile(energy_db, [SNR_NOISE_PERCENTILE, SNR_SPEECH_PERCENTILE])
+        snrs[i] = speech_db - noise_db
+    return snrs
+
+
+def screen_segments_by_snr(audio_data, sr, segments_to_process, snr_threshold):
+    """只保留 SNR 低于阈值的段落，已经干净的段落保持原声不送 DeepFilterNet"""
+    total_samples = len(audio_data)
+    bounds = [(max(0, min(int(seg_start * sr), total_samples)), max(0, min(int(seg_end * sr), total_samples)))
+              for seg_start, seg_end, _ in segments_to_process]
+    snrs = segment_snr(audio_data, sr, bounds)
+    keep = snrs < snr_threshold
+
+    kept = [seg for seg, k in zip(segments_to_process, keep) if k]
+    skipped_dur = sum(e - s for (s, e, _), k in zip(segments_to_process, keep) if not k)
+    total_dur = sum(e - s for s, e, _ in segments_to_process)
+    print(f"   SNR 预筛（阈值 {snr_threshold:.0f} dB）: 跳过 {len(segments_to_process) - len(kept)} 段干净段落，"
+          f"共 {format_time(skipped_dur)}（{skipped_dur / max(total_dur, 1e-9) * 100:.0f}%）")
+    return kept
+
+
+class DenoiseCache:
+    """
+    降噪结果的磁盘缓存，每段一个 .npy，key = sha256(段落采样 + DeepFilterNet 版本 + 参数)。
+
+    每段处理完立刻落盘（先写临时文件再 os.replace），中途崩溃后重跑只处理没缓存的段落；
+    改 crossfade、增减说话人也只会重算新出现的段落。命中时刷新 mtime，
+    超过 ttl_days 没被用到的条目在 prune() 时删除。只缓存 DeepFilterNet 成功处理的段落。
+    """
+
+    def __init__(self, cache_dir, sr, model_id, ttl_days=DENOISE_CACHE_TTL_DAYS):
+        self.dir = cache_dir
+        self.sr = sr
+        self.model_id = model_id
+        self.ttl = ttl_days * 86400
+        os.makedirs(self.dir, exist_ok=True)
+
+    def key(self, samples):
+        h = hashlib.sha256()
+        h.update(json.dumps([DENOISE_CACHE_VERSION, self.model_id, self.sr]).encode())
+        h.update(np.ascontiguousarray(samples, dtype=np.float32).tobytes())
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.dir, f'{key}.npy')
+
+    def has(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            processed = np.load(path)
+        except (OSError, ValueError):
+            return None  # 条目损坏：当作未命中，重新处理后覆盖
+        os.utime(path)
+        return processed
+
+    def put(self, key, processed):
+        tmp = os.path.join(self.dir, f'{key}.{os.getpid()}.tmp.npy')
+        np.save(tmp, np.asarray(processed, dtype=np.float32))
+        os.replace(tmp, self.path(key))
+
+    def prune(self):
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            try:
+                age = now - os.path.getmtime(path)
+                if age > (DENOISE_CACHE_TMP_GRACE_S if name.endswith('.tmp.npy') else self.ttl):
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # 别的进程刚替换或清理掉了
+        return removed
+
+
+def deepfilter_version():
+    """
+    已安装 DeepFilterNet 的版本（写进缓存键；默认模型随版本确定，升级后旧缓存自动失效）。
+
+    先查 deepfilternet 包的元数据，查不到时问 deepFilter CLI；都查不到返回 None。
+    """
+    try:
+        return f"deepfilternet {metadata.version('deepfilternet')}"
+    except metadata.PackageNotFoundError:
+        pass
+    try:
+        result = subprocess.run(['deepFilter', '--version'], capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    version = result.stdout.strip()
+    return version if result.returncode == 0 and version else None
+
+
+# 子进程状态：共享内存里的输入/输出音频 + 常驻的 DeepFilterNet，每个 worker 初始化一次
+_worker = {}
+
+
+def _init_denoise_worker(in_name, in_len, out_name, out_len, sr, threads, work_dir):
+    # OMP/MKL 线程数已由父进程在启动 worker 前写进环境变量；torch 已加载时再显式限制一次
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    _worker["shm"] = (in_shm, out_shm)  # 保持引用，映射在 worker 生命周期内有效
+    _worker["audio"] = np.ndarray((in_len,), dtype=np.float32, buffer=in_shm.buf)
+    _worker["out"] = np.ndarray((out_len,), dtype=np.float32, buffer=out_shm.buf)
+    _worker["runner"] = DeepFilterRunner(sr, work_dir=work_dir)
+
+
+def _denoise_batch(jobs):
+    """jobs: [(段落序号, 起始采样, 结束采样, 输出偏移)]；结果写进输出共享内存，返回值带失败的段落序号"""
+    t0 = time.time()
+    segments = [_worker["audio"][s_idx:e_idx] for _, s_idx, e_idx, _ in jobs]
+    failed = set()
+    for k, processed, ok in _worker["runner"].process(segments):
+        _, s_idx, e_idx, offset = jobs[k]
+        _worker["out"][offset:offset + e_idx - s_idx] = processed
+        if not ok:
+            failed.add(jobs[k][0])
+    indices = [job[0] for job in jobs]
+    return indices, failed, sum(e_idx - s_idx for _, s_idx, e_idx, _ in jobs), time.time() - t0
+
+
+def denoise_parallel(audio_data, sr, bounds, workers, batch_seconds=DF_BATCH_SECONDS, work_dir='.'):
+    """
+    多进程跑 DeepFilterNet：按批分发，yield (段落序号, 处理后音频, 是否成功)。
+
+    输入音频和输出缓冲区都放在共享内存里，子进程直接映射，不做 pickle 拷贝；
+    worker 数不超过 CPU 核数和批数，每个 worker 的 torch 线程数 = 核数 // worker 数。
+    线程数通过 OMP_NUM_THREADS / MKL_NUM_THREADS 在 worker 启动前传下去（子进程里的
+    deepFilter CLI 也继承），避免 N 个 worker × 默认线程数超额占用 CPU。
+    结果按批完成的先后 yield，调用方需要固定顺序时自行排序。
+    """
+    lengths = [e_idx - s_idx for s_idx, e_idx in bounds]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+    batches = plan_df_batches(lengths, int(batch_seconds * sr))
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers, cpus, len(batches)))
+    threads = max(1, cpus // workers)
+    print(f"   {workers} 个 worker × {threads} 线程（{cpus} 核），{len(batches)} 批")
+
+    saved_env = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(threads) for var in THREAD_ENV_VARS})
+    audio = np.ascontiguousarray(audio_data, dtype=np.float32)
+    in_shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(int(offsets[-1]) * 4, 1))
+    try:
+        np.ndarray(audio.shape, dtype=np.float32, buffer=in_shm.buf)[:] = audio
+        out = np.ndarray((int(offsets[-1]),), dtype=np.float32, buffer=out_shm.buf)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_denoise_worker,
+            initargs=(in_shm.name, len(audio), out_shm.name, len(out), sr, threads, work_dir),
+        ) as pool:
+            futures = [
+                pool.submit(_denoise_batch, [(i, *bounds[i], int(offsets[i])) for i in batch])
+                for batch in batches
+            ]
+            for n, future in enumerate(as_completed(futures), 1):
+                indices, failed, samples, elapsed = future.result()
+                print(f"   批 {n}/{len(batches)}: {samples / sr:.1f}s 音频 / {elapsed:.1f}s"
+                      f"（{samples / sr / max(elapsed, 1e-9):.1f}× 实时）")
+                for i in indices:
+                    yield i, out[offsets[i]:offsets[i + 1]].copy(), i not in failed
+    finally:
+        in_shm.close()
+        in_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def denoise_bounds(audio_data, sr, bounds, workers=1, cache_dir=None, batch_seconds=DF_BATCH_SECONDS,
+                   work_dir='.'):
+    """
+    对 audio_data[s_idx:e_idx] 逐段跑 DeepFilterNet，yield (段落序号, 处理后音频, 是否缓存命中)。
+
+    给了 cache_dir 时先查降噪缓存，只把未命中的段落送进 DeepFilterNet，成功处理的段落逐段落盘；
+    DeepFilterNet 失败的段落原样返回，不写缓存，下次重跑会重新处理。
+    """
+    cache = None
+    if cache_dir:
+        model_id = deepfilter_version()
+        if model_id is None:
+            print("\n⚠️ 查不到 DeepFilterNet 版本，本次不使用降噪缓存")
+        else:
+            cache = DenoiseCache(cache_dir, sr, model_id)
+    keys = [cache.key(audio_data[s_idx:e_idx]) for s_idx, e_idx in bounds] if cache else []
+    hits = [i for i in range(len(bounds)) if cache and cache.has(keys[i])]
+    hit_set = set(hits)
+    misses = [i for i in range(len(bounds)) if i not in hit_set]
+    if cache:
+        hit_seconds = sum(bounds[i][1] - bounds[i][0] for i in hits) / sr
+        print(f"\n💾 降噪缓存 {cache_dir}: 命中 {len(hits)}/{len(bounds)} 段（{format_time(hit_seconds)}），"
+              f"需处理 {len(misses)} 段")
+
+    for i in hits:
+        processed = cache.get(keys[i])
+        if processed is None:
+            # 缓存条目读取失败：改为未命中，和其他段落一起重新处理
+            misses.append(i)
+            continue
+        yield i, processed, True
+
+    if misses:
+        t0 = time.time()
+        miss_bounds = [bounds[i] for i in misses]
+        if workers > 1:
+            print(f"\n🔧 开始 DeepFilterNet 处理（多进程，批量）...")
+            results = denoise_parallel(audio_data, sr, miss_bounds, workers, batch_seconds, work_dir)
+        else:
+            runner = DeepFilterRunner(sr, batch_seconds, work_dir)
+            print(f"\n🔧 开始 DeepFilterNet 处理（{'Python API' if runner.mode == 'api' else 'CLI'}，批量）...")
+            results = runner.process([audio_data[s_idx:e_idx] for s_idx, e_idx in miss_bounds])
+        failed = 0
+        for k, processed, ok in results:
+            i = misses[k]
+            if not ok:
+                failed += 1
+            elif cache:
+                cache.put(keys[i], processed)
+            yield i, processed, False
+        if failed:
+            print(f"   ⚠️ {failed} 段 DeepFilterNet 处理失败，保留原音频（未写入缓存）")
+
+        elapsed = time.time() - t0
+        audio_seconds = sum(e_idx - s_idx for s_idx, e_idx in miss_bounds) / sr
+        print(f"   DeepFilterNet 吞吐: {audio_seconds:.1f}s 音频 / {elapsed:.1f}s"
+              f"（{audio_seconds / max(elapsed, 1e-9):.1f}× 实时）")
+
+    if cache:
+        removed = cache.prune()
+        if removed:
+            print(f"   清理 {removed} 个过期缓存条目 / 残留临时文件")
+
+
+def denoise_segments(audio_data, sr, segments_to_process, workers=1, cache_dir=None, work_dir='.'):
+    """
+    批量跑 DeepFilterNet（可走降噪缓存）并逐段 crossfade 就地写回 audio_data，返回 audio_data。
+
+    写回范围不与其他段落重叠的段落（绝大多数）一到就写，先后顺序不影响结果；
+    只有写回范围相互重叠的相邻段落要等整组到齐，再按时间顺序 crossfade，
+    所以输出与批的完成先后无关，也只暂存重叠的那几段，不额外占用与音频等长的内存。
+    整组到齐前组内段落都还没写回，DeepFilterNet 读到的始终是原始采样。
+    """
+    total_samples = len(audio_data)
+    fade_samples = int(CROSSFADE_MS / 1000.0 * sr)
+
+    bounds = []
+    for seg_start, seg_end, _ in segments_to_process:
+        s_idx = max(0, min(int(seg_start * sr), total_samples))
+        e_idx = max(0, min(int(seg_end * sr), total_samples))
+        bounds.append((s_idx, e_idx))
+
+    # 按开始位置扫描，写回范围与前面段落重叠的归入同一组；组号 = 组内第一个段落
+    group, group_size = {}, defaultdict(int)
+    group_id, group_end = None, -1
+    for i in sorted(range(len(bounds)), key=lambda i: bounds[i]):
+        s_idx, e_idx = bounds[i]
+        if group_id is None or s_idx >= group_end:
+            group_id, group_end = i, e_idx
+        else:
+            group_end = max(group_end, e_idx)
+        group[i] = group_id
+        group_size[group_id] += 1
+
+    held = defaultdict(dict)
+    results = denoise_bounds(audio_data, sr, bounds, workers, cache_dir, work_dir=work_dir)
+    for done, (i, processed, cached) in enumerate(results, 1):
+        seg_start, seg_end, speaker = segments_to_process[i]
+        progress = f"[{done}/{len(segments_to_process)}]"
+        print(f"   {progress} {speaker} {format_time(seg_start)}-{format_time(seg_end)} ({seg_end - seg_start:.1f}s)"
+              f"{' 缓存' if cached else ''}")
+        members = held[group[i]]
+        members[i] = processed
+        if len(members) == group_size[group[i]]:
+            for j in sorted(members, key=lambda j: bounds[j]):
+                apply_crossfade(audio_data, members[j], *bounds[j], fade_samples)
+            del held[group[i]]
+    return audio_data
+
+
+def render_previews(audio_data, sr, clips, preview_dir, bitrate, workers=1, cache_dir=None):
+    """
+    并行生成试听对比片段，返回 [(处理前路径, 处理后路径)]。
+
+    片段直接从已解码的 PCM 上切，一起送进 DeepFilterNet（每段单独成批，多 worker 时各跑一段）；
+    处理前的片段一开始就交给编码线程，处理后的片段一出来就编码，A/B 文件并行写出。
+    """
+    if not clips:
+        return []
+    bounds = [(int(cs * sr), int(ce * sr)) for cs, ce, _ in clips]
+    paths = [(os.path.join(preview_dir, f'preview_before_{idx+1}.mp3'),
+              os.path.join(preview_dir, f'preview_after_{idx+1}.mp3')) for idx in range(len(clips))]
+    # 单进程时所有片段打包成一批一次前向；多 worker 时每段单独成批（batch_seconds=0），分给不同 worker
+    batch_seconds = 0 if workers > 1 else DF_BATCH_SECONDS
+
+    with ThreadPoolExecutor(max_workers=min(2 * len(clips), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(encode_output, audio_data[s_idx:e_idx], sr, before, bitrate)
+                   for (s_idx, e_idx), (before, _) in zip(bounds, paths)]
+        for i, processed, _ in denoise_bounds(audio_data, sr, bounds, workers, cache_dir, batch_seconds,
+                                              work_dir=preview_dir):
+            futures.append(pool.submit(encode_output, processed, sr, paths[i][1], bitrate))
+        for future in futures:
+            future.result()
+    return paths
+
+
 def main():
     parser = argparse.ArgumentParser(description='按说话人降噪/去回声')
     parser.add_argument('--audio', required=True, help='音频文件路径')
@@ -209,6 +636,13 @@ def main():
     parser.add_argument('--preview-dir', default='./previews', help='试听片段输出目录')
     parser.add_argument('--preview-count', type=int, default=3, help='试听片段数量')
     parser.add_argument('--preview-duration', type=float, default=15.0, help='每段试听时长（秒）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='DeepFilterNet 并行进程数（Python API 时每个进程加载一次模型，默认 1）')
+    parser.add_argument('--snr-threshold', type=float,
+                        help='只降噪 SNR 低于此值（dB）的段落，干净段落保持原声（不填则全部降噪）')
+    parser.add_argument('--cache-dir',
+                        help='降噪缓存目录（默认 --output 同目录的 denoise_cache/；试听模式只在指定时使用）')
+    parser.add_argument('--no-cache', action='store_true', help='不读写降噪缓存，全部重新处理')
     args = parser.parse_args()
 
     target_speakers = [s.strip() for s in args.speakers.split(',')]
@@ -220,7 +654,6 @@ def main():
     print("   解码音频...")
     audio_data, sr = decode_audio(args.audio)
     total_samples = len(audio_data)
-    fade_samples = int(CROSSFADE_MS / 1000.0 * sr)
     print(f"   采样率: {sr}Hz, 时长: {format_time(total_samples / sr)}")
 
     # 2. 加载说话人段落
@@ -235,26 +668,10 @@ def main():
         if music_ranges:
             print(f"   已加载 {len(music_ranges)} 个音乐段，处理时将跳过")
 
-    def in_music_range(start, end):
-        for ms, me in music_ranges:
-            if start < me and end > ms:
-                return True
-        return False
-
     # 4. 收集要处理的段落
-    segments_to_process = []
-    for speaker in target_speakers:
-        if speaker not in all_segments:
-            print(f"   ⚠️ 说话人 '{speaker}' 未找到，跳过")
-            continue
-        for seg_start, seg_end in all_segments[speaker]:
-            if in_music_range(seg_start, seg_end):
-                continue
-            if seg_end - seg_start < 0.3:  # 太短的段落跳过
-                continue
-            segments_to_process.append((seg_start, seg_end, speaker))
-
-    segments_to_process.sort(key=lambda x: x[0])
+    segments_to_process = collect_target_segments(all_segments, target_speakers, music_ranges)
+    if args.snr_threshold is not None and segments_to_process:
+        segments_to_process = screen_segments_by_snr(audio_data, sr, segments_to_process, args.snr_threshold)
     total_process_dur = sum(e - s for s, e, _ in segments_to_process)
     print(f"   共 {len(segments_to_process)} 段需要处理，总计 {format_time(total_process_dur)}")
 
@@ -272,34 +689,23 @@ def main():
         preview_indices = [step * (i + 1) for i in range(args.preview_count)]
         preview_indices = [i for i in preview_indices if i < len(segments_to_process)]
 
-        tmp_dir = tempfile.mkdtemp()
-        try:
-            for idx, pi in enumerate(preview_indices):
-                seg_start, seg_end, speaker = segments_to_process[pi]
-                # 扩展到 preview_duration 秒
-                center = (seg_start + seg_end) / 2
-                half_dur = args.preview_duration / 2
-                clip_start = max(0, center - half_dur)
-                clip_end = min(total_samples / sr, center + half_dur)
-
-                s_idx = int(clip_start * sr)
-                e_idx = int(clip_end * sr)
-                clip_data = audio_data[s_idx:e_idx]
-
-                # 原版
-                before_path = os.path.join(args.preview_dir, f'preview_before_{idx+1}.mp3')
-                encode_output(clip_data, sr, before_path, args.bitrate)
-
-                # DeepFilterNet 处理版
-                processed_clip = run_deepfilter(clip_data, sr, tmp_dir)
-                after_path = os.path.join(args.preview_dir, f'preview_after_{idx+1}.mp3')
-                encode_output(processed_clip, sr, after_path, args.bitrate)
-
-                print(f"   片段 {idx+1}: {format_time(clip_start)}-{format_time(clip_end)} ({speaker})")
-                print(f"      处理前: {before_path}")
-                print(f"      处理后: {after_path}")
-        finally:
-            shutil.rmtree(tmp_dir, ignore_errors=True)
+        clips = []
+        for pi in preview_indices:
+            seg_start, seg_end, speaker = segments_to_process[pi]
+            # 扩展到 preview_duration 秒
+            center = (seg_start + seg_end) / 2
+            half_dur = args.preview_duration / 2
+            clip_start = max(0, center - half_dur)
+            clip_end = min(total_samples / sr, center + half_dur)
+            clips.append((clip_start, clip_end, speaker))
+
+        paths = render_previews(audio_data, sr, clips, args.preview_dir, args.bitrate,
+                                workers=max(1, args.workers), cache_dir=None if args.no_cache else args.cache_dir)
+
+        for idx, ((clip_start, clip_end, speaker), (before_path, after_path)) in enumerate(zip(clips, paths)):
+            print(f"   片段 {idx+1}: {format_time(clip_start)}-{format_time(clip_end)} ({speaker})")
+            print(f"      处理前: {before_path}")
+            print(f"      处理后: {after_path}")
 
         print(f"\n✅ 试听对比片段已生成 → {args.preview_dir}")
         return
@@ -309,27 +715,12 @@ def main():
         print("❌ 完整处理模式需要 --output 参数")
         sys.exit(1)
 
-    print(f"\n🔧 开始 DeepFilterNet 处理...")
-    result_audio = audio_data.copy()
-    tmp_dir = tempfile.mkdtemp()
-
-    try:
-        for i, (seg_start, seg_end, speaker) in enumerate(segments_to_process):
-            s_idx = int(seg_start * sr)
-            e_idx = int(seg_end * sr)
-            s_idx = max(0, min(s_idx, total_samples))
-            e_idx = max(0, min(e_idx, total_samples))
-
-            segment = audio_data[s_idx:e_idx]
-            dur = seg_end - seg_start
-
-            progress = f"[{i+1}/{len(segments_to_process)}]"
-            print(f"   {progress} {speaker} {format_time(seg_start)}-{format_time(seg_end)} ({dur:.1f}s)")
-
-            processed = run_deepfilter(segment, sr, tmp_dir)
-            result_audio = apply_crossfade(result_audio, processed, s_idx, e_idx, fade_samples)
-    finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(output_dir, 'denoise_cache')
+    result_audio = denoise_segments(audio_data, sr, segments_to_process, workers=max(1, args.workers),
+                                    cache_dir=cache_dir, work_dir=output_dir)
 
     # 7. 备份原文件 + 输出
     if os.path.exists(args.output):